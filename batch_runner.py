@@ -0,0 +1,198 @@
+"""无界面批处理：用保存的工作流JSON处理JSONL数据集
+
+用法:
+    python batch_runner.py workflow.json inputs.jsonl -o outputs.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+from dotenv import load_dotenv
+
+from http_client import AsyncHttpPool
+from response_cache import ResponseCache
+from workflow_engine import DATA_DIR, ExecutionContext, WorkflowExecutor, WorkflowValidationError
+from workflow_loader import load_workflow
+
+# 默认同时运行的工作流实例数
+DEFAULT_BATCH_CONCURRENCY = 8
+
+@dataclass
+class InvalidRecord:
+    """无法解析的输入行，批处理时写出错误结果并继续处理后续记录"""
+    line: int
+    error: str
+
+def iter_jsonl(path: str) -> Iterator[Any]:
+    """逐行读取JSONL，跳过空行；不是合法JSON的行返回 InvalidRecord"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield InvalidRecord(line_number, f"第 {line_number} 行不是合法的JSON: {e}")
+
+def record_to_input(record: Any, input_field: str) -> str:
+    """从输入记录中取出传给开始节点的文本"""
+    if isinstance(record, dict) and input_field in record:
+        record = record[input_field]
+    if isinstance(record, str):
+        return record
+    return json.dumps(record, ensure_ascii=False)
+
+async def run_batch(workflow: Dict[str, Any],
+                    records: Iterator[Any],
+                    output: TextIO,
+                    api_key: str,
+                    tavily_api_key: str = "",
+                    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                    input_field: str = "input",
+                    llm_cache: Optional[ResponseCache] = None,
+                    search_cache: Optional[ResponseCache] = None,
+                    progress_every: int = 100,
+                    trace_output: Optional[TextIO] = None) -> Dict[str, int]:
+    """以有界并发执行多个工作流实例，结果按完成顺序逐行写入 output
+
+    每条结果附带运行统计；指定 trace_output 时追加写入 Chrome trace-event 数组格式，
+    每条记录对应trace中的一个进程。
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    stats = {"total": 0, "succeeded": 0, "failed": 0}
+
+    async with AsyncHttpPool() as http_pool:
+        # 所有实例共享同一个执行器（执行计划只编译一次），每条记录使用独立的运行上下文
+        loaded = load_workflow(workflow)
+        executor = WorkflowExecutor(loaded.workflow, http_pool=http_pool, llm_cache=llm_cache, search_cache=search_cache,
+                                    plan=loaded.plan)
+        secrets = {'openrouter_api_key': api_key, 'tavily_api_key': tavily_api_key}
+        
+        def write_result(result: Dict[str, Any], failed: bool):
+            stats["failed" if failed else "succeeded"] += 1
+            output.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            output.flush()
+
+            done = stats["succeeded"] + stats["failed"]
+            if progress_every and done % progress_every == 0:
+                print(f"已完成 {done} 条，失败 {stats['failed']} 条", file=sys.stderr)
+        
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, record = item
+                context = ExecutionContext(inputs={'user_input': record_to_input(record, input_field)},
+                                           secrets=secrets)
+                started = time.perf_counter()
+                result = {"index": index, "input": record, "output": None, "error": None}
+                try:
+                    result["output"] = await executor.execute(context=context)
+                except Exception as e:
+                    result["error"] = str(e)
+                result["elapsed"] = round(time.perf_counter() - started, 3)
+                if context.trace is not None:
+                    result["trace"] = context.trace.summary()
+                    if trace_output is not None:
+                        for event in context.trace.chrome_trace_events(pid=index):
+                            trace_output.write(json.dumps(event, ensure_ascii=False, default=str) + ",\n")
+                write_result(result, result["error"] is not None)
+
+        async def finish_workers():
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            try:
+                # 按需读取输入，队列满时阻塞，内存占用与数据集大小无关
+                for index, record in enumerate(records):
+                    stats["total"] += 1
+                    if isinstance(record, InvalidRecord):
+                        write_result({"index": index, "line": record.line, "input": None, "output": None,
+                                      "error": record.error}, True)
+                        continue
+                    await queue.put((index, record))
+            except Exception:
+                # 读取输入出错时先处理完已入队的记录，再抛出异常
+                await finish_workers()
+                raise
+            await finish_workers()
+        finally:
+            for task in workers:
+                task.cancel()
+
+    return stats
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="使用保存的工作流批量处理JSONL数据")
+    parser.add_argument("workflow", help="导出的工作流JSON文件")
+    parser.add_argument("inputs", help="输入JSONL文件，每行一个字符串或JSON对象")
+    parser.add_argument("-o", "--output", default="-", help="输出JSONL文件，默认标准输出")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY,
+                        help="同时运行的工作流实例数")
+    parser.add_argument("--input-field", default="input", help="输入记录为对象时，传给开始节点的字段名")
+    parser.add_argument("--no-cache", action="store_true", help="禁用LLM响应和搜索结果缓存")
+    parser.add_argument("--trace-file", help="写出所有运行的Chrome trace-event JSON，可在Perfetto中打开")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.environ.get("OPENROUTER_API_KEY", "")
+    tavily_api_key = os.environ.get("TAVILY_API_KEY", "")
+    if not api_key:
+        print("警告: 未设置 OPENROUTER_API_KEY，LLM节点将调用失败", file=sys.stderr)
+
+    with open(args.workflow, 'r', encoding='utf-8') as f:
+        workflow = json.load(f)
+    try:
+        # 处理任何记录之前校验工作流
+        load_workflow(workflow)
+    except WorkflowValidationError as e:
+        print(f"工作流无效: {e}", file=sys.stderr)
+        return 2
+
+    llm_cache = None
+    search_cache = None
+    if not args.no_cache:
+        llm_cache = ResponseCache(os.path.join(DATA_DIR, "llm_cache.sqlite3"), namespace="llm")
+        search_cache = ResponseCache(os.path.join(DATA_DIR, "search_cache.sqlite3"), namespace="search")
+
+    output = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf-8')
+    trace_output = None
+    if args.trace_file:
+        # JSON数组格式允许省略结尾的 ]，便于边运行边写入
+        trace_output = open(args.trace_file, 'w', encoding='utf-8')
+        trace_output.write("[\n")
+    try:
+        stats = asyncio.run(run_batch(
+            workflow,
+            iter_jsonl(args.inputs),
+            output,
+            api_key,
+            tavily_api_key=tavily_api_key,
+            concurrency=max(1, args.concurrency),
+            input_field=args.input_field,
+            llm_cache=llm_cache,
+            search_cache=search_cache,
+            trace_output=trace_output
+        ))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if trace_output is not None:
+            trace_output.close()
+
+    print(f"批处理完成: 共 {stats['total']} 条，成功 {stats['succeeded']} 条，失败 {stats['failed']} 条",
+          file=sys.stderr)
+    return 0 if stats["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
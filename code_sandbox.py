@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import re
+import signal
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows 不支持内存限制
+    resource = None
+
+# 默认工作进程数、内存上限和超时余量
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+DEFAULT_MEMORY_LIMIT_MB = 256
+TIMEOUT_GRACE = 2.0
+# 每个工作进程缓存的已编译代码对象数量
+COMPILED_CACHE_SIZE = 128
+
+class CodeTimeoutError(Exception):
+    pass
+
+class CodeExecutionError(Exception):
+    pass
+
+def source_hash(code: str) -> str:
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def check_syntax(code: str):
+    """在主进程中校验语法，语法错误不必进入工作进程"""
+    compile(code, '<code_node>', 'exec')
+
+# ---- 以下在工作进程中执行 ----
+
+_compiled: "OrderedDict[str, Any]" = OrderedDict()
+
+def _compiled_code(code_hash: str, code: str):
+    compiled = _compiled.get(code_hash)
+    if compiled is None:
+        compiled = compile(code, '<code_node>', 'exec')
+        _compiled[code_hash] = compiled
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    else:
+        _compiled.move_to_end(code_hash)
+    return compiled
+
+def _on_timeout(signum, frame):
+    raise TimeoutError()
+
+def _warmup() -> int:
+    return os.getpid()
+
+def _run_code(code_hash: str, code: str, input_value: Any, timeout: float,
+              memory_limit_mb: Optional[int]) -> Tuple[str, Any]:
+    """执行代码并返回 (状态, 结果)，状态为 ok / timeout / error"""
+    previous_limit = None
+    if resource is not None and memory_limit_mb:
+        previous_limit = resource.getrlimit(resource.RLIMIT_AS)
+        limit = memory_limit_mb * 1024 * 1024
+        hard = previous_limit[1]
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    if hasattr(signal, 'setitimer'):
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    try:
+        compiled = _compiled_code(code_hash, code)
+        local_vars = {'input': input_value}
+        global_vars = {
+            'json': json,
+            're': re,
+            'datetime': datetime,
+            'str': str,
+            'int': int,
+            'float': float,
+            'len': len,
+            'list': list,
+            'dict': dict
+        }
+        exec(compiled, global_vars, local_vars)
+        output = local_vars.get('output', '')
+    except TimeoutError:
+        return 'timeout', f"代码执行超过 {timeout} 秒"
+    except MemoryError:
+        return 'error', f"代码执行超出内存限制 ({memory_limit_mb}MB)"
+    except Exception as e:
+        return 'error', f"{type(e).__name__}: {e}"
+    finally:
+        if hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if previous_limit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, previous_limit)
+
+    # 结果序列化：无法跨进程传递的对象退化为字符串
+    try:
+        pickle.dumps(output)
+    except Exception:
+        output = repr(output)
+    return 'ok', output
+
+# ---- 主进程 ----
+
+class CodeSandbox:
+    """代码节点的预热进程池：独立进程执行、超时和内存限制、按源码哈希缓存编译结果
+
+    进程池只依赖线程锁和 concurrent.futures，可在多个事件循环和线程之间共享。
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        # spawn 启动，避免在多线程的Streamlit进程中fork
+        self._mp_context = multiprocessing.get_context('spawn')
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._mp_context)
+                # 预热：提前启动全部工作进程
+                for _ in range(self.max_workers):
+                    self._pool.submit(_warmup)
+            return self._pool
+
+    def warm_up(self):
+        self._get_pool()
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """终止卡死或崩溃的进程池，下次调用时重建"""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        for process in list(getattr(pool, '_processes', {}).values()):
+            process.terminate()
+        # 未完成的任务由进程池以 BrokenProcessPool 结束，调用方据此换新进程池重试
+        pool.shutdown(wait=False)
+
+    async def run(self, code: str, input_value: Any, timeout: float = 10,
+                  memory_limit_mb: Optional[int] = DEFAULT_MEMORY_LIMIT_MB) -> Any:
+        """在工作进程中执行代码，返回代码中赋值给 output 的值"""
+        try:
+            check_syntax(code)
+        except SyntaxError as e:
+            raise CodeExecutionError(f"代码语法错误: {e}")
+
+        code_hash = source_hash(code)
+        # 进程池中任一工作进程退出都会使池内所有未完成的任务失败（包括其他代码超时被终止的情况），
+        # 本次代码未必是原因，因此换新进程池重试一次
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                future = pool.submit(_run_code, code_hash, code, input_value, timeout, memory_limit_mb)
+                status, value = await asyncio.wait_for(asyncio.wrap_future(future), timeout + TIMEOUT_GRACE)
+                break
+            except asyncio.TimeoutError:
+                # 工作进程未能响应超时信号（如阻塞在C扩展中），强制终止
+                self._discard_pool(pool)
+                raise CodeTimeoutError(f"代码执行超过 {timeout} 秒，已终止工作进程")
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                if attempt == 0:
+                    continue
+                raise CodeExecutionError("代码执行进程异常退出，可能超出内存限制")
+            except RuntimeError:
+                # 提交前进程池已被其他调用终止并关闭
+                if attempt == 0 and pool is not self._pool:
+                    continue
+                raise
+
+        if status == 'timeout':
+            raise CodeTimeoutError(value)
+        if status == 'error':
+            raise CodeExecutionError(value)
+        return value
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+_default_sandbox: Optional[CodeSandbox] = None
+_default_lock = threading.Lock()
+
+def default_sandbox() -> CodeSandbox:
+    """进程内共享的默认沙箱"""
+    global _default_sandbox
+    with _default_lock:
+        if _default_sandbox is None:
+            _default_sandbox = CodeSandbox()
+        return _default_sandbox
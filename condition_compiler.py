@@ -0,0 +1,123 @@
+import ast
+import operator
+import re
+from functools import lru_cache
+from typing import Any, Callable
+
+class ConditionError(Exception):
+    pass
+
+# 表达式中可调用的内置函数
+SAFE_FUNCTIONS = {
+    'len': len,
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'round': round,
+    'sum': sum,
+    'any': any,
+    'all': all,
+    'sorted': sorted,
+    'list': list,
+    'dict': dict,
+    'set': set,
+    'tuple': tuple,
+    'isinstance': isinstance,
+}
+
+# 表达式中可访问的只读方法
+SAFE_METHODS = frozenset({
+    'lower', 'upper', 'strip', 'lstrip', 'rstrip', 'startswith', 'endswith', 'split',
+    'count', 'find', 'replace', 'isdigit', 'isalpha', 'isspace', 'get', 'keys', 'values', 'items',
+})
+
+# 允许出现的语法节点；不含 lambda、推导式、赋值表达式和幂运算
+_ALLOWED_NODES = tuple(node for node in (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.IfExp, ast.Call, ast.keyword, ast.Attribute, ast.Name, ast.Load, ast.Constant,
+    ast.Subscript, ast.Slice, getattr(ast, 'Index', None), ast.Tuple, ast.List, ast.Set, ast.Dict,
+) if node is not None)
+
+_COMPARISON = re.compile(r'^\s*(==|!=|>=|<=|>|<)\s*(.*?)\s*$', re.S)
+_COMPARISON_OPERATORS = {
+    '==': operator.eq, '!=': operator.ne, '>=': operator.ge,
+    '<=': operator.le, '>': operator.gt, '<': operator.lt,
+}
+
+def _validate_expression(tree: ast.AST):
+    """检查语法树只包含白名单中的节点、变量和函数"""
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ConditionError(f"不支持的语法: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id != 'input' and node.id not in SAFE_FUNCTIONS:
+            raise ConditionError(f"未知的变量或函数: {node.id}")
+        if isinstance(node, ast.Attribute) and node.attr not in SAFE_METHODS:
+            raise ConditionError(f"不允许访问属性: {node.attr}")
+        if isinstance(node, ast.Call):
+            func = node.func
+            if not (isinstance(func, ast.Name) or isinstance(func, ast.Attribute)):
+                raise ConditionError("只能调用内置函数或只读方法")
+
+def _compile_expression(condition: str) -> Callable[[Any], bool]:
+    try:
+        tree = ast.parse(condition.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ConditionError(f"语法错误: {e.msg}")
+    _validate_expression(tree)
+    code = compile(tree, '<condition>', 'eval')
+    global_vars = {'__builtins__': {}, **SAFE_FUNCTIONS}
+
+    def evaluate(input_value: Any) -> bool:
+        return bool(eval(code, global_vars, {'input': input_value}))
+    return evaluate
+
+def _compile_comparison(condition: str) -> Callable[[Any], bool]:
+    match = _COMPARISON.match(condition)
+    if not match:
+        raise ConditionError("比较条件格式应为 '运算符 值'，如 '> 10' 或 '== done'")
+    compare = _COMPARISON_OPERATORS[match.group(1)]
+    expected = match.group(2)
+    try:
+        expected_number = float(expected)
+    except ValueError:
+        expected_number = None
+
+    def evaluate(input_value: Any) -> bool:
+        # 两边都是数字时按数值比较，否则按字符串比较
+        if expected_number is not None:
+            try:
+                return compare(float(input_value), expected_number)
+            except (TypeError, ValueError):
+                pass
+        return compare(str(input_value), expected)
+    return evaluate
+
+@lru_cache(maxsize=256)
+def compile_condition(condition_type: str, condition: str) -> Callable[[Any], bool]:
+    """把条件配置编译为判断函数 f(input) -> bool，相同条件只编译一次
+
+    condition_type:
+        expression  Python表达式，只允许白名单中的语法和函数
+        contains    输入文本包含条件字符串
+        regex       输入文本匹配正则表达式
+        comparison  与常量比较，如 '> 10'
+    """
+    if condition_type == 'expression':
+        return _compile_expression(condition)
+    if condition_type == 'contains':
+        return lambda input_value: condition in str(input_value)
+    if condition_type == 'regex':
+        try:
+            pattern = re.compile(condition)
+        except re.error as e:
+            raise ConditionError(f"正则表达式无效: {e}")
+        return lambda input_value: pattern.search(str(input_value)) is not None
+    if condition_type == 'comparison':
+        return _compile_comparison(condition)
+    raise ConditionError(f"未知的条件类型: {condition_type}")
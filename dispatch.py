@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+import httpx
+
+import tracing
+from http_client import AsyncHttpPool
+
+# 各服务商的默认限流参数：每秒请求数和突发容量
+DEFAULT_PROVIDER_LIMITS = {
+    "openrouter": {"rate": 10.0, "burst": 20},
+    "tavily": {"rate": 5.0, "burst": 10},
+}
+
+# Retry-After 最长等待时间（秒）
+MAX_RETRY_AFTER = 120.0
+
+@dataclass
+class RetryPolicy:
+    """指数退避 + 全抖动重试策略"""
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    retry_statuses: FrozenSet[int] = field(default_factory=lambda: frozenset({429, 500, 502, 503, 504}))
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头，支持秒数和HTTP日期两种格式"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """令牌桶限流；状态由线程锁保护，可跨事件循环和线程共享"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预占一个令牌，返回需要等待的秒数（令牌可透支，等待时间随排队长度增加）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后打开，冷却期内请求排队等待而不是直接失败"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_until = 0.0
+        self._lock = threading.Lock()
+
+    def _admit(self) -> Tuple[float, bool]:
+        """返回 (等待秒数, 是否为探测请求)，等待秒数为0表示可以发起请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0, False
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self._opened_until:
+                # 冷却结束，放行一个探测请求
+                self.state = self.HALF_OPEN
+                return 0.0, True
+            if self.state == self.OPEN:
+                return self._opened_until - now, False
+            # 半开状态下已有探测请求在进行，稍后再试
+            return min(1.0, self.reset_timeout), False
+
+    async def wait_until_admitted(self) -> bool:
+        """等待放行，返回本次请求是否为半开状态的探测请求"""
+        while True:
+            wait, probe = self._admit()
+            if wait <= 0:
+                return probe
+            await asyncio.sleep(wait)
+
+    def release_probe(self):
+        """探测请求没有得出结果就结束（被取消或非网络异常）时释放半开名额，由下一个请求重新探测"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self._opened_until = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_until = time.monotonic() + self.reset_timeout
+
+class ProviderDispatcher:
+    """外部服务调用调度：按服务商/API密钥限流、熔断，429/5xx 自动退避重试
+
+    只保存限流和熔断状态，不持有连接，可在多个执行器和多次运行之间共享。
+    """
+
+    def __init__(self,
+                 limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0):
+        self.limits = limits or DEFAULT_PROVIDER_LIMITS
+        self.retry = retry or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # 不随运行结束等待的后台任务，完成前在这里保持引用
+        self._detached: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    def _bucket(self, provider: str, api_key: str) -> Optional[TokenBucket]:
+        limit = self.limits.get(provider)
+        if not limit:
+            return None
+        key = (provider, hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16])
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(limit["rate"], int(limit["burst"]))
+                self._buckets[key] = bucket
+            return bucket
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[provider] = breaker
+            return breaker
+
+    def detach(self, task: asyncio.Task):
+        """持有后台任务直到其完成，发起任务的运行可以先结束"""
+        with self._lock:
+            self._detached.add(task)
+        task.add_done_callback(self._forget)
+
+    def _forget(self, task: asyncio.Task):
+        with self._lock:
+            self._detached.discard(task)
+
+    async def _admit(self, provider: str, api_key: str) -> bool:
+        """等待熔断器放行并取得令牌，返回本次请求是否为探测请求"""
+        breaker = self.breaker(provider)
+        probe = await breaker.wait_until_admitted()
+        bucket = self._bucket(provider, api_key)
+        if bucket is not None:
+            try:
+                await bucket.acquire()
+            except BaseException:
+                if probe:
+                    breaker.release_probe()
+                raise
+        return probe
+
+    def _record(self, provider: str, status_code: Optional[int]):
+        # 5xx 和网络错误计入熔断；429 只做退避，不视为服务故障
+        if status_code is None or status_code >= 500:
+            self.breaker(provider).record_failure()
+        else:
+            self.breaker(provider).record_success()
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, MAX_RETRY_AFTER)
+        return self.retry.backoff(attempt)
+
+    def _can_retry(self, attempt: int) -> bool:
+        return attempt + 1 < self.retry.max_attempts
+
+    def _before_retry(self, provider: str, reason: str, delay: float, attempt: int,
+                      log: Optional[Callable[..., None]]):
+        tracing.record_retry()
+        if log is not None:
+            log(f"{provider} 请求失败（{reason}），{delay:.1f} 秒后第 {attempt + 1} 次重试", "WARNING")
+
+    async def request(self, pool: AsyncHttpPool, provider: str, api_key: str, method: str, url: str,
+                      log: Optional[Callable[..., None]] = None, **kwargs) -> httpx.Response:
+        """发送请求，可重试的失败自动退避；重试耗尽后返回最后一次响应或抛出网络异常"""
+        attempt = 0
+        while True:
+            probe = await self._admit(provider, api_key)
+            recorded = False
+            try:
+                try:
+                    response = await pool.request(method, url, **kwargs)
+                except httpx.TransportError as e:
+                    self._record(provider, None)
+                    recorded = True
+                    if not self._can_retry(attempt):
+                        raise
+                    delay = self._retry_delay(attempt, None)
+                    reason = f"网络错误 {type(e).__name__}"
+                else:
+                    self._record(provider, response.status_code)
+                    recorded = True
+                    if response.status_code not in self.retry.retry_statuses or not self._can_retry(attempt):
+                        return response
+                    delay = self._retry_delay(attempt, response)
+                    reason = f"状态码 {response.status_code}"
+            finally:
+                # 取消或其他异常中断了探测请求，熔断器不能停留在半开状态
+                if probe and not recorded:
+                    self.breaker(provider).release_probe()
+            self._before_retry(provider, reason, delay, attempt, log)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @asynccontextmanager
+    async def stream(self, pool: AsyncHttpPool, provider: str, api_key: str, method: str, url: str,
+                     log: Optional[Callable[..., None]] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+        """流式请求；只在开始读取响应体之前重试"""
+        attempt = 0
+        yielded = False
+        while True:
+            probe = await self._admit(provider, api_key)
+            recorded = False
+            delay = None
+            try:
+                async with pool.stream(method, url, **kwargs) as response:
+                    self._record(provider, response.status_code)
+                    recorded = True
+                    if response.status_code in self.retry.retry_statuses and self._can_retry(attempt):
+                        delay = self._retry_delay(attempt, response)
+                        reason = f"状态码 {response.status_code}"
+                    else:
+                        yielded = True
+                        yield response
+                        return
+            except httpx.TransportError as e:
+                if yielded:
+                    raise
+                self._record(provider, None)
+                recorded = True
+                if not self._can_retry(attempt):
+                    raise
+                delay = self._retry_delay(attempt, None)
+                reason = f"网络错误 {type(e).__name__}"
+            finally:
+                if probe and not recorded:
+                    self.breaker(provider).release_probe()
+            self._before_retry(provider, reason, delay, attempt, log)
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,90 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+import tracing
+
+# 连接池默认参数
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_PER_HOST_LIMIT = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+def _http2_available() -> bool:
+    """安装了 h2 时才启用 HTTP/2"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _request_size(request: httpx.Request) -> int:
+    try:
+        return len(request.content)
+    except httpx.RequestNotRead:
+        return 0
+
+class AsyncHttpPool:
+    """执行器共享的异步HTTP客户端：长连接复用、按主机限流、可用时启用HTTP/2"""
+
+    def __init__(self,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+                 per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY):
+        self.per_host_limit = per_host_limit
+        self.http2 = _http2_available()
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry
+            ),
+            follow_redirects=True
+        )
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def request(self, method: str, url: str, timeout: Optional[float] = 30, **kwargs) -> httpx.Response:
+        """发送请求并读取完整响应体"""
+        async with self._host_semaphore(url):
+            response = await self._client.request(method, url, timeout=timeout, **kwargs)
+        tracing.record_http(_request_size(response.request), response.num_bytes_downloaded)
+        return response
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, timeout: Optional[float] = 30, **kwargs) -> AsyncIterator[httpx.Response]:
+        """流式请求，响应体由调用方逐块读取"""
+        async with self._host_semaphore(url):
+            async with self._client.stream(method, url, timeout=timeout, **kwargs) as response:
+                try:
+                    yield response
+                finally:
+                    tracing.record_http(_request_size(response.request), response.num_bytes_downloaded)
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "AsyncHttpPool":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
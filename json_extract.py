@@ -0,0 +1,168 @@
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+# 顶层只需找开括号；值内部只关心引号和括号；字符串内只关心引号和转义
+_OPEN = re.compile(r'[\[{]')
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING = re.compile(r'["\\]')
+_CLOSERS = {'{': '}', '[': ']'}
+# 连续重新扫描的次数上限，超出后只尝试已闭合的内层区间，避免病态输入下反复扫描
+MAX_RESCANS = 16
+
+# 区间解析结果的标记（JSON本身可以解析出 None）
+_INVALID = object()
+_TOO_DEEP = object()
+
+def _parse(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return _INVALID
+    except RecursionError:
+        # 嵌套过深的区间同样视为不是JSON
+        return _TOO_DEEP
+
+class IncrementalJSONExtractor:
+    """从混杂文本中提取JSON对象和数组，可逐块输入流式响应
+
+    按括号配对线性扫描（跳过字符串内的括号），每个顶层区间闭合时解析一次。
+    顶层区间不是合法JSON（如正文中的花括号）、括号不匹配或到输入结束仍未闭合时：
+    区间内出现过引号则从其开括号的下一个字符重新扫描，正文中落单的引号不会吞掉后面的JSON；
+    没有引号时括号配对是准确的，依次尝试其中已闭合的内层区间。
+    已扫描完且不属于未闭合区间的文本会被丢弃，缓冲区只保留当前区间。
+
+    >>> extract_json('I think {"maybe} here is the answer {"nodes": [1, 2]}')
+    {'nodes': [1, 2]}
+    >>> extract_json_values('{ 说明 {"a": 1} 和 [2, 3] }')
+    [{'a': 1}, [2, 3]]
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        # 未闭合的开括号 (括号, 位置)
+        self._stack: List[Tuple[str, int]] = []
+        self._in_string = False
+        # 当前顶层区间内已闭合的内层区间
+        self._spans: List[Tuple[int, int]] = []
+        # 当前顶层区间内是否出现过引号（出现过时字符串状态可能被正文中的引号带偏）
+        self._quoted = False
+        # 自上次成功解析以来连续重新扫描的次数
+        self._rescans = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        """输入一段文本，返回这段文本中新闭合的JSON值"""
+        text = self._buffer + chunk
+        pos = self._pos
+        values: List[Any] = []
+        while True:
+            if self._in_string:
+                match = _STRING.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(text):
+                        # 转义符在块末尾，等下一块再判断
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+
+            if not self._stack:
+                match = _OPEN.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                self._stack.append((match.group(), match.start()))
+                self._spans = []
+                self._quoted = False
+                pos = match.end()
+                continue
+
+            match = _STRUCTURE.search(text, pos)
+            if match is None:
+                pos = len(text)
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+                self._quoted = True
+            elif char in _CLOSERS:
+                self._stack.append((char, match.start()))
+            else:
+                top_start = self._stack[0][1]
+                opener, start = self._stack.pop()
+                if _CLOSERS[opener] != char:
+                    # 括号不匹配：当前顶层区间不是JSON
+                    pos = self._reject(text, top_start, pos, values)
+                elif self._stack:
+                    self._spans.append((start, pos))
+                else:
+                    value = _parse(text[start:pos])
+                    if value is _INVALID or value is _TOO_DEEP:
+                        pos = self._reject(text, start, pos, values, rescan=value is _INVALID)
+                    else:
+                        values.append(value)
+                        self._spans = []
+                        self._rescans = 0
+
+        keep_from = self._stack[0][1] if self._stack else pos
+        self._buffer = text[keep_from:]
+        self._pos = pos - keep_from
+        self._stack = [(opener, start - keep_from) for opener, start in self._stack]
+        self._spans = [(start - keep_from, end - keep_from) for start, end in self._spans]
+        return values
+
+    def finish(self) -> List[Any]:
+        """输入结束：仍未闭合的顶层区间按同样规则处理，其中的JSON仍可返回"""
+        values: List[Any] = []
+        while self._stack:
+            self._pos = self._reject(self._buffer, self._stack[0][1], len(self._buffer), values)
+            values.extend(self.feed(""))
+        self._buffer = ""
+        self._pos = 0
+        self._in_string = False
+        self._spans = []
+        self._rescans = 0
+        return values
+
+    def _reject(self, text: str, top_start: int, pos: int, values: List[Any], rescan: bool = True) -> int:
+        """放弃从 top_start 开始的顶层区间，返回继续扫描的位置"""
+        quoted = self._quoted
+        self._stack = []
+        self._in_string = False
+        self._quoted = False
+        if rescan and quoted and self._rescans < MAX_RESCANS:
+            self._rescans += 1
+            self._spans = []
+            return top_start + 1
+        # 按起始位置依次解析内层区间，已解析区间内的子区间不再重复返回
+        parsed_end = -1
+        for start, end in sorted(self._spans):
+            if start < parsed_end:
+                continue
+            value = _parse(text[start:end])
+            if value is _INVALID or value is _TOO_DEEP:
+                continue
+            values.append(value)
+            parsed_end = end
+        self._spans = []
+        return pos
+
+def extract_json_values(text: str) -> List[Any]:
+    """提取文本中所有顶层JSON对象和数组"""
+    extractor = IncrementalJSONExtractor()
+    return extractor.feed(text) + extractor.finish()
+
+def extract_json(text: str, expected_type: Optional[type] = None) -> Any:
+    """返回文本中第一个JSON对象或数组（可限定类型），没有时返回None"""
+    for value in extract_json_values(text):
+        if expected_type is None or isinstance(value, expected_type):
+            return value
+    return None
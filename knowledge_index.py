@@ -0,0 +1,276 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 分块默认参数（字符数）
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CHUNK_OVERLAP = 50
+# 哈希稠密向量维度
+DENSE_DIM = 256
+# BM25参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+# 混合检索时稠密向量得分的权重
+HYBRID_DENSE_WEIGHT = 0.3
+
+_INDEX_NAME = re.compile(r'^[\w\-]+$')
+_TOKEN = re.compile(r'[a-z0-9]+|[\u4e00-\u9fff]+')
+_CJK = re.compile(r'[\u4e00-\u9fff]')
+
+class KnowledgeIndexError(Exception):
+    pass
+
+def tokenize(text: str) -> List[str]:
+    """英文和数字按单词切分，连续汉字切分为二元组（单字保留原样）"""
+    tokens = []
+    for run in _TOKEN.findall(text.lower()):
+        if _CJK.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def chunk_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
+    """按段落合并成不超过 chunk_size 的块，过长的段落按滑动窗口切分"""
+    overlap = max(0, min(overlap, chunk_size // 2))
+    chunks: List[str] = []
+    current = ""
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(current) + len(paragraph) + 1 <= chunk_size:
+            current = f"{current}\n{paragraph}" if current else paragraph
+            continue
+        if current:
+            chunks.append(current)
+            current = ""
+        if len(paragraph) <= chunk_size:
+            current = paragraph
+        else:
+            step = chunk_size - overlap
+            for start in range(0, len(paragraph), step):
+                piece = paragraph[start:start + chunk_size]
+                chunks.append(piece)
+                if start + chunk_size >= len(paragraph):
+                    break
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _dense_vector(tokens: Sequence[str], dim: int) -> np.ndarray:
+    """特征哈希得到的词袋向量（L2归一化），无需额外的嵌入模型"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token, count in Counter(tokens).items():
+        h = zlib.crc32(token.encode('utf-8'))
+        vector[h % dim] += (1.0 if (h >> 31) & 1 else -1.0) * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+def index_path(root: str, name: str) -> str:
+    if not _INDEX_NAME.match(name or ''):
+        raise KnowledgeIndexError(f"知识库名称只能包含字母、数字、下划线和连字符: {name}")
+    return os.path.join(root, name)
+
+def list_indexes(root: str) -> List[Dict[str, Any]]:
+    """列出 root 下所有知识库的元信息"""
+    if not os.path.isdir(root):
+        return []
+    indexes = []
+    for name in sorted(os.listdir(root)):
+        meta_file = os.path.join(root, name, 'meta.json')
+        if os.path.isfile(meta_file):
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                indexes.append(json.load(f))
+    return indexes
+
+class KnowledgeIndex:
+    """磁盘上的BM25倒排索引（可选哈希稠密向量）
+
+    倒排表、文档长度、块文本和向量都保存为 .npy/二进制文件，加载时内存映射，
+    查询只读取命中词项的倒排列表。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, 'vocab.json'), 'r', encoding='utf-8') as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        with open(os.path.join(path, 'sources.json'), 'r', encoding='utf-8') as f:
+            self.sources: List[str] = json.load(f)
+
+        def load(name: str) -> np.ndarray:
+            try:
+                return np.load(os.path.join(path, name), mmap_mode='r')
+            except ValueError:
+                # 空数组无法内存映射
+                return np.load(os.path.join(path, name))
+        self.postings_offsets = load('postings_offsets.npy')
+        self.postings_docs = load('postings_docs.npy')
+        self.postings_tf = load('postings_tf.npy')
+        self.idf = load('idf.npy')
+        self.doc_len = load('doc_len.npy')
+        self.text_offsets = load('text_offsets.npy')
+        self._texts = np.memmap(os.path.join(path, 'texts.bin'), dtype=np.uint8, mode='r') \
+            if os.path.getsize(os.path.join(path, 'texts.bin')) else np.zeros(0, dtype=np.uint8)
+        dense_file = os.path.join(path, 'dense.npy')
+        self.dense = load('dense.npy') if os.path.exists(dense_file) else None
+        self.avgdl = float(self.meta.get('avgdl') or 1.0)
+
+    @property
+    def chunk_count(self) -> int:
+        return int(self.meta['chunk_count'])
+
+    def chunk(self, chunk_id: int) -> str:
+        start, end = int(self.text_offsets[chunk_id]), int(self.text_offsets[chunk_id + 1])
+        return bytes(self._texts[start:end]).decode('utf-8')
+
+    def bm25_scores(self, tokens: Sequence[str]) -> np.ndarray:
+        scores = np.zeros(self.chunk_count, dtype=np.float32)
+        k1, b = self.meta['k1'], self.meta['b']
+        for token in set(tokens):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            norm = k1 * (1 - b + b * self.doc_len[docs] / self.avgdl)
+            # 同一词项的倒排列表中文档ID不重复，可以直接按下标累加
+            scores[docs] += self.idf[term_id] * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 5, mode: str = "bm25") -> List[Dict[str, Any]]:
+        """返回得分最高的 top_k 个块：[{chunk_id, source, score, text}]"""
+        if self.chunk_count == 0:
+            return []
+        tokens = tokenize(query)
+        scores = self.bm25_scores(tokens)
+        if mode == "hybrid" and self.dense is not None:
+            peak = float(scores.max())
+            if peak > 0:
+                scores = scores / peak
+            dense_scores = np.asarray(self.dense @ _dense_vector(tokens, self.dense.shape[1]))
+            scores = (1 - HYBRID_DENSE_WEIGHT) * scores + HYBRID_DENSE_WEIGHT * np.maximum(dense_scores, 0)
+
+        top_k = max(1, min(top_k, self.chunk_count))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [
+            {
+                "chunk_id": int(i),
+                "source": self.sources[i],
+                "score": round(float(scores[i]), 4),
+                "text": self.chunk(int(i)),
+            }
+            for i in ranked if scores[i] > 0
+        ]
+
+    @classmethod
+    def build(cls, path: str, documents: Sequence[Tuple[str, str]],
+              chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP,
+              dense: bool = True) -> "KnowledgeIndex":
+        """从 (文档名, 文本) 列表建立索引，写入临时目录后整体替换旧索引"""
+        chunks: List[str] = []
+        sources: List[str] = []
+        for source, text in documents:
+            for piece in chunk_text(text, chunk_size, overlap):
+                chunks.append(piece)
+                sources.append(source)
+        if not chunks:
+            raise KnowledgeIndexError("文档中没有可索引的文本")
+
+        vocab: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_len = np.zeros(len(chunks), dtype=np.int32)
+        dense_vectors = np.zeros((len(chunks), DENSE_DIM), dtype=np.float32) if dense else None
+        for chunk_id, piece in enumerate(chunks):
+            tokens = tokenize(piece)
+            doc_len[chunk_id] = len(tokens)
+            for token, count in Counter(tokens).items():
+                term_id = vocab.setdefault(token, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((chunk_id, count))
+            if dense_vectors is not None:
+                dense_vectors[chunk_id] = _dense_vector(tokens, DENSE_DIM)
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings]) if postings else []
+        postings_docs = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        postings_tf = np.fromiter((c for p in postings for _, c in p), dtype=np.float32, count=int(offsets[-1]))
+        n = len(chunks)
+        df = np.diff(offsets).astype(np.float32)
+        idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        encoded = [piece.encode('utf-8') for piece in chunks]
+        text_offsets = np.zeros(n + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum([len(e) for e in encoded]) if encoded else []
+
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, 'postings_offsets.npy'), offsets)
+        np.save(os.path.join(tmp_path, 'postings_docs.npy'), postings_docs)
+        np.save(os.path.join(tmp_path, 'postings_tf.npy'), postings_tf)
+        np.save(os.path.join(tmp_path, 'idf.npy'), idf)
+        np.save(os.path.join(tmp_path, 'doc_len.npy'), doc_len)
+        np.save(os.path.join(tmp_path, 'text_offsets.npy'), text_offsets)
+        if dense_vectors is not None:
+            np.save(os.path.join(tmp_path, 'dense.npy'), dense_vectors)
+        with open(os.path.join(tmp_path, 'texts.bin'), 'wb') as f:
+            for e in encoded:
+                f.write(e)
+        with open(os.path.join(tmp_path, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        with open(os.path.join(tmp_path, 'sources.json'), 'w', encoding='utf-8') as f:
+            json.dump(sources, f, ensure_ascii=False)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                "name": os.path.basename(path),
+                "documents": sorted(set(sources)),
+                "chunk_count": n,
+                "vocab_size": len(vocab),
+                "avgdl": float(doc_len.mean()) if n else 0.0,
+                "k1": BM25_K1,
+                "b": BM25_B,
+                "dense_dim": DENSE_DIM if dense else 0,
+                "chunk_size": chunk_size,
+                "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }, f, ensure_ascii=False, indent=2)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return cls(path)
+
+# 已加载的索引，按目录和 meta.json 修改时间缓存；重建后自动重新加载
+_open_indexes: Dict[str, Tuple[float, KnowledgeIndex]] = {}
+_open_lock = threading.Lock()
+
+def open_index(path: str) -> Optional[KnowledgeIndex]:
+    """打开（或复用已打开的）索引，不存在时返回None"""
+    meta_file = os.path.join(path, 'meta.json')
+    try:
+        mtime = os.path.getmtime(meta_file)
+    except OSError:
+        return None
+    with _open_lock:
+        cached = _open_indexes.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        index = KnowledgeIndex(path)
+        _open_indexes[path] = (mtime, index)
+        return index
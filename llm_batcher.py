@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import tracing
+from json_extract import extract_json_values
+
+# 收集同组调用的时间窗口（秒）和每批最多条数
+DEFAULT_BATCH_WINDOW = 0.02
+DEFAULT_MAX_BATCH_SIZE = 10
+# concurrent 模式下同一批内同时发出的请求数
+DEFAULT_BATCH_CONCURRENCY = 4
+# packed 模式合并请求的 max_tokens 上限
+PACKED_MAX_TOKENS = 8000
+
+PACKED_INSTRUCTION = (
+    "你将收到一个JSON数组，每个元素是一条独立的用户请求。请逐条独立处理，"
+    "只返回一个JSON数组，长度与输入相同，第i个元素是对第i条请求的回答（字符串），不要输出任何其他内容。"
+)
+
+# send(data, ctx) -> (文本, tokens)
+SendFunc = Callable[[Dict[str, Any], Any], Awaitable[Tuple[str, int]]]
+
+@dataclass
+class _PendingCall:
+    data: Dict[str, Any]
+    ctx: Any
+    future: asyncio.Future
+    # 发起调用的节点span，请求的网络消耗计入这里而不是触发发送的节点
+    span: Optional[tracing.NodeSpan] = None
+
+@dataclass
+class _Batch:
+    mode: str
+    calls: List[_PendingCall] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+def _user_prompt(data: Dict[str, Any]) -> str:
+    return data['messages'][-1]['content']
+
+def split_packed_response(content: str, expected: int) -> Optional[List[str]]:
+    """解析合并请求返回的JSON数组，条数不符或无法解析时返回None"""
+    items = next((value for value in extract_json_values(content)
+                  if isinstance(value, list) and len(value) == expected), None)
+    if items is None:
+        return None
+    return [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in items]
+
+class LLMBatcher:
+    """LLM调用微批处理：短时间窗口内模型和参数相同的调用合并为一批
+
+    concurrent 模式对批内调用限制并发逐个发送；packed 模式把整批输入打包成一个
+    要求返回JSON数组的请求，解析失败时退回 concurrent。
+    等待中的调用只在同一事件循环内合并，每个批次使用独立的并发限制。
+    """
+
+    def __init__(self, send: SendFunc,
+                 window: float = DEFAULT_BATCH_WINDOW,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 concurrency: int = DEFAULT_BATCH_CONCURRENCY):
+        self.send = send
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self._open: Dict[str, _Batch] = {}
+        # 正在发送的批次任务，完成前保持引用，避免等待中的调用因任务被回收而永远挂起
+        self._dispatching: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def group_key(mode: str, data: Dict[str, Any], api_key: str) -> str:
+        """同组条件：批处理模式、API密钥以及除用户提示词外的全部请求参数"""
+        params = {k: v for k, v in data.items() if k != 'messages'}
+        params['system'] = data['messages'][:-1]
+        payload = json.dumps([mode, params, hashlib.sha256(api_key.encode('utf-8')).hexdigest()],
+                             ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def submit(self, mode: str, data: Dict[str, Any], ctx: Any, api_key: str) -> Tuple[str, int]:
+        """加入当前批次并等待结果，返回 (文本, tokens)"""
+        loop = asyncio.get_event_loop()
+        key = self.group_key(mode, data, api_key)
+        batch = self._open.get(key)
+        if batch is None:
+            batch = _Batch(mode=mode)
+            batch.timer = loop.call_later(self.window, self._flush, key)
+            self._open[key] = batch
+        call = _PendingCall(data=data, ctx=ctx, future=loop.create_future(), span=tracing.current_span.get())
+        batch.calls.append(call)
+        if len(batch.calls) >= self.max_batch_size:
+            self._flush(key)
+        return await call.future
+
+    def _flush(self, key: str):
+        batch = self._open.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._dispatch(batch))
+        self._dispatching.add(task)
+        task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch: _Batch):
+        # 发送任务复制了触发发送的调用方的上下文，资源消耗改为按调用分别记录
+        tracing.current_span.set(None)
+        try:
+            if batch.mode == 'packed' and len(batch.calls) > 1:
+                if await self._send_packed(batch.calls):
+                    return
+            await self._send_concurrent(batch.calls)
+        except Exception as e:
+            for call in batch.calls:
+                if not call.future.done():
+                    call.future.set_exception(e)
+        except BaseException:
+            for call in batch.calls:
+                call.future.cancel()
+            raise
+
+    async def _send_concurrent(self, calls: List[_PendingCall]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if len(calls) > 1:
+            for call in calls:
+                call.ctx.log(f"批量调用: 本批 {len(calls)} 条请求，并发数 {self.concurrency}")
+
+        async def send_one(call: _PendingCall):
+            # 每条调用在独立任务中发送，网络消耗计入发起调用的节点
+            tracing.current_span.set(call.span)
+            async with semaphore:
+                try:
+                    result = await self.send(call.data, call.ctx)
+                except Exception as e:
+                    if not call.future.done():
+                        call.future.set_exception(e)
+                    return
+            if not call.future.done():
+                call.future.set_result(result)
+
+        await asyncio.gather(*(send_one(call) for call in calls))
+
+    async def _send_packed(self, calls: List[_PendingCall]) -> bool:
+        """打包发送整批输入，成功拆分并返回结果时返回True"""
+        first = calls[0]
+        data = dict(first.data)
+        messages = [dict(m) for m in first.data['messages'][:-1]]
+        if messages and messages[0].get('role') == 'system':
+            messages[0]['content'] = f"{messages[0]['content']}\n\n{PACKED_INSTRUCTION}"
+        else:
+            messages.insert(0, {"role": "system", "content": PACKED_INSTRUCTION})
+        messages.append({
+            "role": "user",
+            "content": json.dumps([_user_prompt(call.data) for call in calls], ensure_ascii=False)
+        })
+        data['messages'] = messages
+        data['max_tokens'] = min(int(first.data.get('max_tokens', 1000)) * len(calls), PACKED_MAX_TOKENS)
+
+        # 合并请求的网络消耗先单独累计，再平均分摊到批内各调用的节点
+        usage = tracing.NodeSpan(node_id="", name="批量调用", node_type="llm", queued_at=time.time())
+        token = tracing.current_span.set(usage)
+        try:
+            text, tokens = await self.send(data, first.ctx)
+        finally:
+            tracing.current_span.reset(token)
+            tracing.share_usage(usage, [call.span for call in calls])
+        parts = split_packed_response(text, len(calls))
+        if parts is None:
+            for call in calls:
+                call.ctx.log(f"批量调用: 合并响应无法拆分为 {len(calls)} 条，改为逐条发送", "WARNING")
+            return False
+
+        # tokens 按条数平均分摊
+        share, remainder = divmod(tokens, len(calls))
+        for index, (call, part) in enumerate(zip(calls, parts)):
+            call.ctx.log(f"批量调用: {len(calls)} 条请求合并为 1 个请求")
+            if not call.future.done():
+                call.future.set_result((part, share + (1 if index < remainder else 0)))
+        return True
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import reprlib
+from typing import Any
+
+# 日志预览默认长度（字符数）
+DEFAULT_PREVIEW_LENGTH = 100
+
+_MISSING = object()
+
+_preview_repr = reprlib.Repr()
+_preview_repr.maxlevel = 3
+_preview_repr.maxdict = 6
+_preview_repr.maxlist = 6
+_preview_repr.maxtuple = 6
+_preview_repr.maxstring = DEFAULT_PREVIEW_LENGTH
+_preview_repr.maxother = DEFAULT_PREVIEW_LENGTH
+
+def preview(value: Any, limit: int = DEFAULT_PREVIEW_LENGTH) -> str:
+    """日志用的截断预览：只格式化显示得到的部分，大对象不会整体转成字符串"""
+    if isinstance(value, PortValue):
+        value = value.value
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, bytes):
+        text = f"<{len(value)} 字节>"
+    else:
+        text = _preview_repr.repr(value)
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+class PortValue:
+    """节点端口之间传递的值：原始对象按引用传递，文本和JSON形式在首次需要时生成并缓存
+
+    kind 为 text（字符串）、json（字典和标量）、bytes 或 list。
+    """
+    __slots__ = ('value', 'kind', '_text', '_pretty', '_data', '_digest')
+
+    def __init__(self, value: Any):
+        self.value = value
+        if isinstance(value, str):
+            self.kind = 'text'
+        elif isinstance(value, (bytes, bytearray)):
+            self.kind = 'bytes'
+        elif isinstance(value, (list, tuple)):
+            self.kind = 'list'
+        else:
+            self.kind = 'json'
+        self._text = value if self.kind == 'text' else None
+        self._pretty = None
+        self._data = _MISSING
+        self._digest = None
+
+    @property
+    def text(self) -> str:
+        """作为提示词、URL和文本处理输入的字符串形式；字典和列表序列化为JSON"""
+        if self._text is None:
+            if self.value is None:
+                self._text = ""
+            elif self.kind == 'bytes':
+                self._text = bytes(self.value).decode('utf-8', errors='replace')
+            elif self.kind == 'list' or isinstance(self.value, dict):
+                self._text = json.dumps(self.value, ensure_ascii=False, default=str)
+            else:
+                self._text = str(self.value)
+        return self._text
+
+    @property
+    def pretty_text(self) -> str:
+        """带缩进的JSON文本（字典和列表），其他类型同 text"""
+        if self._pretty is None:
+            if self.kind == 'list' or isinstance(self.value, dict):
+                self._pretty = json.dumps(self.value, ensure_ascii=False, indent=2, default=str)
+            else:
+                self._pretty = self.text
+        return self._pretty
+
+    @property
+    def data(self) -> Any:
+        """结构化形式：JSON文本会被解析（解析失败时为原文本），其他类型为原始值"""
+        if self._data is _MISSING:
+            self._data = self.value
+            if self.kind in ('text', 'bytes') and self.text.lstrip()[:1] in ('{', '['):
+                try:
+                    self._data = json.loads(self.text)
+                except (ValueError, RecursionError):
+                    pass
+        return self._data
+
+    @property
+    def digest(self) -> str:
+        """类型和文本形式的SHA-256，用于节点指纹；直接哈希已缓存的文本，不再重新序列化"""
+        if self._digest is None:
+            hasher = hashlib.sha256(self.kind.encode('ascii'))
+            hasher.update(b'\0')
+            hasher.update(self.text.encode('utf-8', errors='surrogatepass'))
+            self._digest = hasher.hexdigest()
+        return self._digest
+
+    def preview(self, limit: int = DEFAULT_PREVIEW_LENGTH) -> str:
+        return preview(self.value, limit)
@@ -0,0 +1,94 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from port_value import PortValue
+
+class TemplateError(Exception):
+    pass
+
+# {{ 和 }} 转义为字面括号；{变量} 可带 .键 和 [下标] 路径；其他花括号（如JSON示例）原样保留
+_TOKEN = re.compile(r'\{\{|\}\}|\{([A-Za-z_]\w*)((?:\.\w+|\[-?\d+\])*)\}')
+_PATH_STEP = re.compile(r'\.(\w+)|\[(-?\d+)\]')
+
+# 路径中的一步：(键, None) 或 (None, 下标)
+PathStep = Tuple[Optional[str], Optional[int]]
+# 文本片段或 (变量名, 路径, 原始占位符)
+Segment = Union[str, Tuple[str, Tuple[PathStep, ...], str]]
+
+class CompiledTemplate:
+    """解析后的模板：文本片段和变量片段依次排列，渲染时一次拼接，插入的值不会被再次替换"""
+
+    def __init__(self, source: str, segments: List[Segment]):
+        self.source = source
+        self.segments = segments
+        self.variables = frozenset(segment[0] for segment in segments if not isinstance(segment, str))
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """values 可以是原始值或 PortValue，后者复用已缓存的文本和解析结果"""
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+            else:
+                name, path, placeholder = segment
+                parts.append(_format(_resolve(values.get(name), path, placeholder)))
+        return "".join(parts)
+
+def _resolve(value: Any, path: Tuple[PathStep, ...], placeholder: str) -> Any:
+    if isinstance(value, PortValue) and path:
+        value = value.data
+    for key, index in path:
+        if value is None:
+            return None
+        if isinstance(value, str) and value.lstrip()[:1] in ('{', '['):
+            # 上游输出的JSON文本按结构访问
+            try:
+                value = json.loads(value)
+            except (ValueError, RecursionError):
+                pass
+        try:
+            if index is not None:
+                value = value[index]
+            elif isinstance(value, (list, tuple)) and key.isdigit():
+                value = value[int(key)]
+            else:
+                value = value[key]
+        except (KeyError, IndexError, TypeError):
+            raise TemplateError(f"无法解析模板变量 {placeholder}")
+    return value
+
+def _format(value: Any) -> str:
+    if isinstance(value, PortValue):
+        return value.text
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else PortValue(value).text
+
+@lru_cache(maxsize=512)
+def compile_template(source: str, variables: Optional[Tuple[str, ...]] = None) -> CompiledTemplate:
+    """解析模板，相同模板只解析一次；指定 variables 时引用其他变量会抛出 TemplateError"""
+    segments: List[Segment] = []
+    text: List[str] = []
+    position = 0
+    for match in _TOKEN.finditer(source):
+        text.append(source[position:match.start()])
+        position = match.end()
+        token = match.group()
+        if token in ('{{', '}}'):
+            text.append(token[0])
+            continue
+        name = match.group(1)
+        if variables is not None and name not in variables:
+            raise TemplateError(f"模板中使用了未知变量 {token}，可用变量: {', '.join(variables)}")
+        path = tuple((key, None) if key else (None, int(index))
+                     for key, index in _PATH_STEP.findall(match.group(2)))
+        if "".join(text):
+            segments.append("".join(text))
+        text = []
+        segments.append((name, path, token))
+    text.append(source[position:])
+    if "".join(text):
+        segments.append("".join(text))
+    return CompiledTemplate(source, segments)
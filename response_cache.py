@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# 默认缓存参数
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_DISK_ENTRIES = 5000
+DEFAULT_TTL = 7 * 24 * 3600
+
+def make_cache_key(*parts: Any) -> str:
+    """对请求的关键参数做内容寻址哈希"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """两级响应缓存：内存LRU + SQLite磁盘，支持TTL和容量淘汰
+
+    写入时可指定 stale_ttl：新鲜期过后的这段时间内条目仍可通过 get_entry 读出（标记为过期），
+    供调用方先返回旧值再后台刷新。
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 namespace: str = "default",
+                 max_memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 max_disk_entries: int = DEFAULT_DISK_ENTRIES,
+                 ttl: Optional[float] = DEFAULT_TTL):
+        self.path = path
+        self.namespace = namespace
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        # key -> (value, expires_at, fresh_until)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 正在后台刷新的键，缓存在多次运行之间共享，同一条目同时只刷新一次
+        self._refreshing: set = set()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL,
+                    fresh_until REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(cache_entries)")]
+            if 'fresh_until' not in columns:
+                # 旧版本缓存文件没有新鲜期字段，视为与过期时间相同
+                self._conn.execute("ALTER TABLE cache_entries ADD COLUMN fresh_until REAL")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries (namespace, accessed_at)"
+            )
+            self._conn.commit()
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    def _remember(self, key: str, value: Any, expires_at: Optional[float], fresh_until: Optional[float]):
+        self._memory[key] = (value, expires_at, fresh_until)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """返回 (值, 是否新鲜)，不存在或已超过过期宽限时返回None；调用方需持有锁"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at, fresh_until = entry
+            if expires_at is None or expires_at > now:
+                self._memory.move_to_end(key)
+                return value, fresh_until is None or fresh_until > now
+            del self._memory[key]
+
+        if self._conn is not None:
+            row = self._conn.execute(
+                "SELECT value, expires_at, fresh_until FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is not None:
+                expires_at = row[1]
+                fresh_until = row[2] if row[2] is not None else expires_at
+                if expires_at is None or expires_at > now:
+                    value = json.loads(row[0])
+                    self._conn.execute(
+                        "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                        (now, self.namespace, key)
+                    )
+                    self._conn.commit()
+                    self._remember(key, value, expires_at, fresh_until)
+                    return value, fresh_until is None or fresh_until > now
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                )
+                self._conn.commit()
+        return None
+
+    def get(self, key: str) -> Optional[Any]:
+        """命中返回缓存值，未命中或已过新鲜期返回None"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and entry[1]:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """返回 (缓存值, 是否新鲜)，过了新鲜期但仍在 stale_ttl 内的条目也会返回"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+            elif entry[1]:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry
+
+    def begin_refresh(self, key: str) -> bool:
+        """标记条目开始后台刷新，已有刷新在进行时返回False；刷新结束后需调用 end_refresh"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: str):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, stale_ttl: float = 0):
+        """写入两级缓存，value 需可JSON序列化；stale_ttl 为新鲜期后仍可读出旧值的时长"""
+        now = time.time()
+        fresh_until = self._expires_at(ttl)
+        expires_at = fresh_until + stale_ttl if fresh_until is not None else None
+        with self._lock:
+            self._remember(key, value, expires_at, fresh_until)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries "
+                    "(namespace, key, value, created_at, expires_at, accessed_at, fresh_until) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value, ensure_ascii=False), now, expires_at, now, fresh_until)
+                )
+                self._evict_disk(now)
+                self._conn.commit()
+
+    def _evict_disk(self, now: float):
+        # 先清理过期条目，再按最近访问时间淘汰超出容量的部分
+        self._conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, now)
+        )
+        count = self._conn.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                (self.namespace, self.namespace, overflow)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                "memory_entries": len(self._memory)}
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from response_cache import make_cache_key
+
+# 最多保留的运行记录数，超出后删除最早的运行
+DEFAULT_MAX_RUNS = 500
+
+class RunJournal:
+    """基于SQLite的运行日志：每个节点完成后立即写入状态和输出，失败的运行可以从检查点继续"""
+
+    def __init__(self, path: str, max_runs: int = DEFAULT_MAX_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                workflow_name TEXT NOT NULL DEFAULT '',
+                workflow_hash TEXT NOT NULL,
+                inputs TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                started_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_updated ON runs (updated_at);
+            CREATE TABLE IF NOT EXISTS run_nodes (
+                run_id TEXT NOT NULL,
+                node_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                fingerprint TEXT,
+                outputs TEXT,
+                error TEXT,
+                finished_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, node_id)
+            );
+        """)
+        self._conn.commit()
+
+    def start_run(self, run_id: str, workflow: Dict[str, Any], inputs: Dict[str, Any]):
+        """记录运行开始；继续执行已有的运行时保留其开始时间和已完成的节点"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, workflow_name, workflow_hash, inputs, status, error, started_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'running', NULL, ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET workflow_hash = excluded.workflow_hash, "
+                "status = 'running', error = NULL, updated_at = excluded.updated_at",
+                (run_id, workflow.get('name', ''), make_cache_key(workflow.get('nodes', [])),
+                 json.dumps(inputs, ensure_ascii=False, default=str), now, now)
+            )
+            self._prune()
+            self._conn.commit()
+
+    def record_node(self, run_id: str, node_id: str, status: str, fingerprint: Optional[str] = None,
+                    outputs: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO run_nodes (run_id, node_id, status, fingerprint, outputs, error, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, node_id, status, fingerprint,
+                 json.dumps(outputs, ensure_ascii=False, default=str) if outputs is not None else None, error, now)
+            )
+            self._conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+            self._conn.commit()
+
+    def finish_run(self, run_id: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, error = ?, updated_at = ? WHERE run_id = ?",
+                (status, error, datetime.now().isoformat(), run_id)
+            )
+            self._conn.commit()
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, workflow_name, workflow_hash, inputs, status, error, started_at, updated_at "
+                "FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'run_id': row[0], 'workflow_name': row[1], 'workflow_hash': row[2], 'inputs': json.loads(row[3]),
+            'status': row[4], 'error': row[5], 'started_at': row[6], 'updated_at': row[7]
+        }
+
+    def list_runs(self, limit: int = 20, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按更新时间倒序列出运行摘要"""
+        query = "SELECT run_id, workflow_name, status, error, started_at, updated_at FROM runs"
+        params: list = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY updated_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {'run_id': r[0], 'workflow_name': r[1], 'status': r[2], 'error': r[3], 'started_at': r[4], 'updated_at': r[5]}
+            for r in rows
+        ]
+
+    def completed_nodes(self, run_id: str) -> Dict[str, Dict[str, Any]]:
+        """已成功节点的 {node_id: {"fingerprint", "outputs"}}，可直接作为 ExecutionContext.reuse"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node_id, fingerprint, outputs FROM run_nodes "
+                "WHERE run_id = ? AND status = 'success' AND fingerprint IS NOT NULL",
+                (run_id,)
+            ).fetchall()
+        return {r[0]: {'fingerprint': r[1], 'outputs': json.loads(r[2]) if r[2] else {}} for r in rows}
+
+    def _prune(self):
+        overflow = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0] - self.max_runs
+        if overflow > 0:
+            old_ids = [r[0] for r in self._conn.execute(
+                "SELECT run_id FROM runs ORDER BY updated_at LIMIT ?", (overflow,)
+            )]
+            self._conn.executemany("DELETE FROM run_nodes WHERE run_id = ?", [(i,) for i in old_ids])
+            self._conn.executemany("DELETE FROM runs WHERE run_id = ?", [(i,) for i in old_ids])
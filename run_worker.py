@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from http_client import AsyncHttpPool
+from workflow_engine import ExecutionContext, ExecutionSink, NodeStatus, WorkflowExecutor
+
+# 内存中保留的已结束运行数，超出后丢弃最早结束的运行
+DEFAULT_MAX_FINISHED_RUNS = 100
+
+@dataclass
+class RunState:
+    """后台运行的状态：由工作线程写入，页面轮询读取"""
+    run_id: str
+    workflow_name: str
+    context: ExecutionContext
+    status: str = NodeStatus.RUNNING.value
+    result: Any = None
+    error: Optional[str] = None
+    # LLM节点流式输出的token片段，读取时才拼接
+    stream_chunks: Dict[str, List[str]] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    future: Optional[Future] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def logs(self) -> List[str]:
+        return list(self.context.execution_log)
+
+    @property
+    def node_status(self) -> Dict[str, NodeStatus]:
+        return dict(self.context.node_status)
+
+    @property
+    def streamed_text(self) -> Dict[str, str]:
+        """各LLM节点已流式输出的文本"""
+        return {node_id: "".join(chunks) for node_id, chunks in list(self.stream_chunks.items())}
+
+class _BufferSink(ExecutionSink):
+    """把流式token累积到运行状态，日志和节点状态直接从 context 读取"""
+    wants_tokens = True
+
+    def __init__(self, state: RunState):
+        self.state = state
+
+    def on_token(self, node_id: str, token: str):
+        # 只追加片段，避免每个token都复制整段文本
+        chunks = self.state.stream_chunks.get(node_id)
+        if chunks is None:
+            chunks = self.state.stream_chunks[node_id] = []
+        chunks.append(token)
+
+class RunWorker:
+    """进程内常驻的工作流执行线程
+
+    所有运行提交到同一个持久事件循环，共用一个HTTP连接池；提交后立即返回运行ID，
+    页面刷新或交互不会中断运行，多个会话的运行在同一循环内并发执行。
+    """
+
+    def __init__(self, max_finished_runs: int = DEFAULT_MAX_FINISHED_RUNS):
+        self.max_finished_runs = max_finished_runs
+        self._lock = threading.Lock()
+        self._runs: "OrderedDict[str, RunState]" = OrderedDict()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="workflow-worker", daemon=True)
+        self._thread.start()
+        # 连接池只在工作线程的事件循环内使用
+        self.http_pool: AsyncHttpPool = asyncio.run_coroutine_threadsafe(self._create_pool(), self._loop).result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _create_pool(self) -> AsyncHttpPool:
+        return AsyncHttpPool()
+
+    def submit(self, executor: WorkflowExecutor, context: ExecutionContext, resume_run_id: Optional[str] = None) -> str:
+        """提交运行并立即返回运行ID；resume_run_id 不为空时从运行日志继续执行该运行
+
+        该运行仍在执行时不会重复提交，直接返回其运行ID。
+        """
+        if resume_run_id is not None:
+            running = self.get(resume_run_id)
+            if running is not None and not running.done:
+                return resume_run_id
+            context.run_id = resume_run_id
+        state = RunState(run_id=context.run_id, workflow_name=executor.workflow.get('name', ''), context=context)
+        context.sink = _BufferSink(state)
+        executor.http_pool = self.http_pool
+        if resume_run_id is not None:
+            coroutine = executor.resume(resume_run_id, context)
+        else:
+            coroutine = executor.execute(context=context)
+        with self._lock:
+            self._runs.pop(state.run_id, None)
+            self._runs[state.run_id] = state
+            self._evict()
+        state.future = asyncio.run_coroutine_threadsafe(self._run(state, coroutine), self._loop)
+        return state.run_id
+
+    async def _run(self, state: RunState, coroutine):
+        try:
+            state.result = await coroutine
+            state.status = NodeStatus.SUCCESS.value
+        except asyncio.CancelledError:
+            state.status = NodeStatus.FAILED.value
+            state.error = "运行已取消"
+        except Exception as e:
+            state.status = NodeStatus.FAILED.value
+            state.error = str(e)
+        finally:
+            state.finished_at = time.time()
+
+    def get(self, run_id: str) -> Optional[RunState]:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def list_runs(self) -> List[RunState]:
+        """按提交顺序倒序列出内存中的运行"""
+        with self._lock:
+            return list(reversed(self._runs.values()))
+
+    def cancel(self, run_id: str) -> bool:
+        state = self.get(run_id)
+        if state is None or state.future is None or state.done:
+            return False
+        return state.future.cancel()
+
+    def _evict(self):
+        finished = [run_id for run_id, state in self._runs.items() if state.done]
+        for run_id in finished[:max(0, len(finished) - self.max_finished_runs)]:
+            del self._runs[run_id]
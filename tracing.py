@@ -0,0 +1,223 @@
+import contextvars
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+@dataclass
+class NodeSpan:
+    """单个节点一次执行的计时和资源消耗"""
+    node_id: str
+    name: str
+    node_type: str
+    queued_at: float
+    started_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    status: str = "pending"
+    # 网络请求发送/接收的字节数
+    bytes_out: int = 0
+    bytes_in: int = 0
+    tokens: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+    error: Optional[str] = None
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+
+    @property
+    def wall_time(self) -> float:
+        if self.started_at is None or self.ended_at is None:
+            return 0.0
+        return self.ended_at - self.started_at
+
+    @property
+    def queue_time(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return self.started_at - self.queued_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "node_id": self.node_id,
+            "name": self.name,
+            "type": self.node_type,
+            "status": self.status,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "queue_time": round(self.queue_time, 6),
+            "wall_time": round(self.wall_time, 6),
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "tokens": self.tokens,
+            "cache_hits": self.cache_hits,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+@dataclass
+class RunTrace:
+    """一次工作流运行的全部节点span"""
+    run_id: str
+    workflow_name: str = ""
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+    spans: Dict[str, NodeSpan] = field(default_factory=dict)
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def start_span(self, node: Dict[str, Any]) -> NodeSpan:
+        span = NodeSpan(node_id=node['id'], name=node.get('name', node['id']), node_type=node.get('type', ''),
+                        queued_at=time.time())
+        self.spans[node['id']] = span
+        return span
+
+    def finish(self):
+        self.ended_at = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        spans = list(self.spans.values())
+        ended_at = self.ended_at or time.time()
+        slowest = max(spans, key=lambda s: s.wall_time, default=None)
+        return {
+            "run_id": self.run_id,
+            "workflow": self.workflow_name,
+            "wall_time": round(ended_at - self.started_at, 6),
+            "nodes": len(spans),
+            "tokens": sum(s.tokens for s in spans),
+            "bytes_out": sum(s.bytes_out for s in spans),
+            "bytes_in": sum(s.bytes_in for s in spans),
+            "cache_hits": sum(s.cache_hits for s in spans),
+            "retries": sum(s.retries for s in spans),
+            "slowest_node": slowest.name if slowest else None,
+            "slowest_node_time": round(slowest.wall_time, 6) if slowest else 0.0,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"summary": self.summary(), "spans": [s.to_dict() for s in self.spans.values()]}
+
+    def chrome_trace_events(self, pid: Any = 1) -> List[Dict[str, Any]]:
+        """Chrome trace-event 格式的事件（X完整事件，单位微秒），每个节点一条轨道"""
+        events = [{
+            "name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+            "args": {"name": f"{self.workflow_name or 'workflow'} ({self.run_id[:8]})"}
+        }]
+        for tid, span in enumerate(self.spans.values(), start=1):
+            if span.started_at is None:
+                continue
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": span.name}})
+            if span.queue_time > 0:
+                events.append({
+                    "name": f"{span.name} (排队)", "cat": "queue", "ph": "X", "pid": pid, "tid": tid,
+                    "ts": span.queued_at * 1e6, "dur": span.queue_time * 1e6
+                })
+            events.append({
+                "name": span.name, "cat": span.node_type, "ph": "X", "pid": pid, "tid": tid,
+                "ts": span.started_at * 1e6, "dur": span.wall_time * 1e6,
+                "args": {k: v for k, v in span.to_dict().items()
+                         if k in ("status", "bytes_out", "bytes_in", "tokens", "cache_hits", "retries", "error")}
+            })
+        return events
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        return {"traceEvents": self.chrome_trace_events(), "displayTimeUnit": "ms"}
+
+    def to_otel(self) -> Dict[str, Any]:
+        """OpenTelemetry OTLP/JSON 格式：整次运行为根span，节点为子span"""
+        def attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+            result = []
+            for key, value in values.items():
+                if value is None:
+                    continue
+                if isinstance(value, bool):
+                    result.append({"key": key, "value": {"boolValue": value}})
+                elif isinstance(value, int):
+                    result.append({"key": key, "value": {"intValue": str(value)}})
+                elif isinstance(value, float):
+                    result.append({"key": key, "value": {"doubleValue": value}})
+                else:
+                    result.append({"key": key, "value": {"stringValue": str(value)}})
+            return result
+
+        root_span_id = uuid.uuid4().hex[:16]
+        ended_at = self.ended_at or time.time()
+        spans = [{
+            "traceId": self.trace_id,
+            "spanId": root_span_id,
+            "name": f"workflow {self.workflow_name}".strip(),
+            "kind": 1,
+            "startTimeUnixNano": str(int(self.started_at * 1e9)),
+            "endTimeUnixNano": str(int(ended_at * 1e9)),
+            "attributes": attributes({"aiflow.run_id": self.run_id, **{
+                f"aiflow.{k}": v for k, v in self.summary().items() if k not in ("run_id", "workflow")
+            }}),
+        }]
+        for span in self.spans.values():
+            if span.started_at is None:
+                continue
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": root_span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(span.started_at * 1e9)),
+                "endTimeUnixNano": str(int((span.ended_at or ended_at) * 1e9)),
+                "attributes": attributes({
+                    "aiflow.node_id": span.node_id,
+                    "aiflow.node_type": span.node_type,
+                    "aiflow.queue_time": span.queue_time,
+                    "aiflow.bytes_out": span.bytes_out,
+                    "aiflow.bytes_in": span.bytes_in,
+                    "aiflow.tokens": span.tokens,
+                    "aiflow.cache_hits": span.cache_hits,
+                    "aiflow.retries": span.retries,
+                }),
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            })
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": attributes({"service.name": "aiflow"})},
+                "scopeSpans": [{"scope": {"name": "aiflow.workflow_engine"}, "spans": spans}],
+            }]
+        }
+
+# 当前正在执行的节点span；每个节点在独立的asyncio任务中运行，互不干扰
+current_span = contextvars.ContextVar("current_span", default=None)
+
+def record_http(bytes_out: int, bytes_in: int):
+    span = current_span.get()
+    if span is not None:
+        span.bytes_out += bytes_out
+        span.bytes_in += bytes_in
+
+def record_retry():
+    span = current_span.get()
+    if span is not None:
+        span.retries += 1
+
+def record_tokens(tokens: int):
+    span = current_span.get()
+    if span is not None:
+        span.tokens += tokens or 0
+
+def record_cache_hit():
+    span = current_span.get()
+    if span is not None:
+        span.cache_hits += 1
+
+def share_usage(usage: NodeSpan, spans: List[Optional[NodeSpan]]):
+    """多个节点共同发起的请求（如合并的LLM批量请求）的网络消耗平均分摊到各节点的span"""
+    for attr in ("bytes_out", "bytes_in", "retries"):
+        share, remainder = divmod(getattr(usage, attr), len(spans))
+        for index, span in enumerate(spans):
+            if span is not None:
+                setattr(span, attr, getattr(span, attr) + share + (1 if index < remainder else 0))
+
+def record_child_run(summary: Dict[str, Any]):
+    """把子工作流（如循环体）一次运行的资源消耗计入当前span"""
+    span = current_span.get()
+    if span is not None:
+        span.tokens += summary.get("tokens", 0)
+        span.bytes_out += summary.get("bytes_out", 0)
+        span.bytes_in += summary.get("bytes_in", 0)
+        span.cache_hits += summary.get("cache_hits", 0)
+        span.retries += summary.get("retries", 0)
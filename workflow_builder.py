@@ -1,4 +1,5 @@
 import streamlit as st
+import copy
 import json
 import requests
 from datetime import datetime
@@ -7,12 +8,29 @@ from typing import Dict, List, Any, Optional, Callable
 import os
 import uuid
 from dataclasses import dataclass, field
-from enum import Enum
 import streamlit.components.v1 as components
-import asyncio
 import time
 from concurrent.futures import ThreadPoolExecutor
-import re
+from code_sandbox import CodeSandbox
+from dispatch import ProviderDispatcher
+from json_extract import extract_json_values
+from knowledge_index import DEFAULT_CHUNK_SIZE, KnowledgeIndex, KnowledgeIndexError, index_path, list_indexes
+from response_cache import ResponseCache, make_cache_key
+from run_journal import RunJournal
+from run_worker import RunWorker
+from workflow_loader import load_workflow
+from workflow_store import DEFAULT_PAGE_SIZE, WorkflowStore
+from workflow_engine import (
+    DATA_DIR,
+    DEFAULT_MAX_CONCURRENCY,
+    KNOWLEDGE_DIR,
+    NODE_CONFIGS,
+    ExecutionContext,
+    NodeStatus,
+    NodeType,
+    WorkflowExecutor,
+    WorkflowValidationError,
+)
 
 # 页面配置
 st.set_page_config(
@@ -21,302 +39,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# 节点类型定义
-class NodeType(Enum):
-    START = "start"
-    END = "end"
-    LLM = "llm"
-    KNOWLEDGE_RETRIEVAL = "knowledge_retrieval"
-    HTTP_REQUEST = "http_request"
-    CODE = "code"
-    CONDITION = "condition"
-    TEXT_PROCESSING = "text_processing"
-    VARIABLE = "variable"
-    WEB_SEARCH = "web_search"
-    DATA_TRANSFORM = "data_transform"
-    LOOP = "loop"
-
-# 节点执行状态
-class NodeStatus(Enum):
-    PENDING = "pending"
-    RUNNING = "running"
-    SUCCESS = "success"
-    FAILED = "failed"
-    SKIPPED = "skipped"
-
-# 节点配置
-NODE_CONFIGS = {
-    NodeType.START: {
-        "name": "开始",
-        "icon": "▶️",
-        "color": "#e0f2fe",
-        "description": "工作流起点，接收用户输入",
-        "executor": "execute_start_node",
-        "inputs": [],
-        "outputs": ["output"],
-        "config_fields": {
-            "input_type": {
-                "type": "select",
-                "label": "输入类型",
-                "options": ["text", "json", "file"],
-                "default": "text"
-            },
-            "prompt": {
-                "type": "textarea",
-                "label": "提示信息",
-                "default": "请输入您的内容："
-            }
-        }
-    },
-    NodeType.END: {
-        "name": "结束",
-        "icon": "🏁",
-        "color": "#d1fae5",
-        "description": "工作流终点，输出最终结果",
-        "executor": "execute_end_node",
-        "inputs": ["input"],
-        "outputs": [],
-        "config_fields": {
-            "output_format": {
-                "type": "select",
-                "label": "输出格式",
-                "options": ["text", "json", "markdown"],
-                "default": "text"
-            }
-        }
-    },
-    NodeType.LLM: {
-        "name": "大语言模型",
-        "icon": "🧠",
-        "color": "#fef3c7",
-        "description": "调用AI模型处理文本",
-        "executor": "execute_llm_node",
-        "inputs": ["prompt", "context"],
-        "outputs": ["text", "tokens_used"],
-        "config_fields": {
-            "model": {
-                "type": "select",
-                "label": "模型",
-                "options": ["gpt-3.5-turbo", "gpt-4", "claude-3", "deepseek-chat"],
-                "default": "gpt-3.5-turbo"
-            },
-            "system_prompt": {
-                "type": "textarea",
-                "label": "系统提示词",
-                "default": "你是一个有帮助的AI助手。"
-            },
-            "user_prompt_template": {
-                "type": "textarea",
-                "label": "用户提示词模板",
-                "default": "{input}",
-                "help": "使用 {变量名} 引用输入"
-            },
-            "temperature": {
-                "type": "slider",
-                "label": "温度",
-                "min": 0.0,
-                "max": 2.0,
-                "default": 0.7,
-                "step": 0.1
-            },
-            "max_tokens": {
-                "type": "number",
-                "label": "最大令牌数",
-                "default": 1000,
-                "min": 100,
-                "max": 4000
-            }
-        }
-    },
-    NodeType.WEB_SEARCH: {
-        "name": "网络搜索",
-        "icon": "🔍",
-        "color": "#e0e7ff",
-        "description": "搜索互联网获取实时信息",
-        "executor": "execute_web_search_node",
-        "inputs": ["query"],
-        "outputs": ["results", "urls"],
-        "config_fields": {
-            "search_depth": {
-                "type": "select",
-                "label": "搜索深度",
-                "options": ["basic", "advanced"],
-                "default": "basic",
-                "help": "basic: 快速搜索, advanced: 深度搜索"
-            },
-            "num_results": {
-                "type": "number",
-                "label": "结果数量",
-                "default": 5,
-                "min": 1,
-                "max": 10
-            },
-            "search_type": {
-                "type": "select",
-                "label": "搜索类型",
-                "options": ["general", "news", "academic"],
-                "default": "general",
-                "help": "general: 通用搜索, news: 新闻搜索, academic: 学术搜索"
-            },
-            "days": {
-                "type": "number",
-                "label": "时间范围（天）",
-                "default": 30,
-                "min": 1,
-                "max": 365,
-                "help": "搜索最近N天内的内容"
-            }
-        }
-    },
-    NodeType.HTTP_REQUEST: {
-        "name": "HTTP请求",
-        "icon": "🌐",
-        "color": "#fce7f3",
-        "description": "调用外部API获取数据",
-        "executor": "execute_http_request_node",
-        "inputs": ["url", "params"],
-        "outputs": ["response", "status_code"],
-        "config_fields": {
-            "method": {
-                "type": "select",
-                "label": "请求方法",
-                "options": ["GET", "POST", "PUT", "DELETE"],
-                "default": "GET"
-            },
-            "url_template": {
-                "type": "text",
-                "label": "URL模板",
-                "default": "https://api.example.com/endpoint",
-                "help": "可以使用 {变量名} 插入输入值"
-            },
-            "headers": {
-                "type": "json",
-                "label": "请求头",
-                "default": {"Content-Type": "application/json"}
-            },
-            "timeout": {
-                "type": "number",
-                "label": "超时时间（秒）",
-                "default": 30,
-                "min": 1,
-                "max": 300
-            }
-        }
-    },
-    NodeType.CODE: {
-        "name": "代码执行",
-        "icon": "💻",
-        "color": "#f0f9ff",
-        "description": "执行自定义Python代码处理数据",
-        "executor": "execute_code_node",
-        "inputs": ["input"],
-        "outputs": ["output"],
-        "config_fields": {
-            "code": {
-                "type": "code",
-                "label": "Python代码",
-                "default": """# 输入变量: input
-# 返回结果赋值给: output
-
-output = input.upper() if isinstance(input, str) else str(input)""",
-                "language": "python"
-            },
-            "timeout": {
-                "type": "number",
-                "label": "超时时间（秒）",
-                "default": 10,
-                "min": 1,
-                "max": 60
-            }
-        }
-    },
-    NodeType.CONDITION: {
-        "name": "条件判断",
-        "icon": "🔀",
-        "color": "#fdf4ff",
-        "description": "根据条件选择不同分支",
-        "executor": "execute_condition_node",
-        "inputs": ["input"],
-        "outputs": ["true_output", "false_output"],
-        "config_fields": {
-            "condition_type": {
-                "type": "select",
-                "label": "条件类型",
-                "options": ["expression", "contains", "regex", "comparison"],
-                "default": "expression"
-            },
-            "condition": {
-                "type": "text",
-                "label": "条件表达式",
-                "default": "len(str(input)) > 10",
-                "help": "Python表达式，使用 input 变量"
-            },
-            "true_value": {
-                "type": "text",
-                "label": "条件为真时的输出",
-                "default": "{input}"
-            },
-            "false_value": {
-                "type": "text",
-                "label": "条件为假时的输出",
-                "default": ""
-            }
-        }
-    },
-    NodeType.TEXT_PROCESSING: {
-        "name": "文本处理",
-        "icon": "📝",
-        "color": "#eff6ff",
-        "description": "对文本进行各种处理操作",
-        "executor": "execute_text_processing_node",
-        "inputs": ["text"],
-        "outputs": ["processed_text"],
-        "config_fields": {
-            "operation": {
-                "type": "select",
-                "label": "操作类型",
-                "options": ["extract", "replace", "split", "join", "format"],
-                "default": "extract"
-            },
-            "pattern": {
-                "type": "text",
-                "label": "模式/分隔符",
-                "default": "",
-                "help": "正则表达式或分隔符"
-            },
-            "template": {
-                "type": "textarea",
-                "label": "格式模板",
-                "default": "{text}",
-                "help": "用于format操作"
-            }
-        }
-    },
-    NodeType.DATA_TRANSFORM: {
-        "name": "数据转换",
-        "icon": "🔄",
-        "color": "#f3e8ff",
-        "description": "转换数据格式或结构",
-        "executor": "execute_data_transform_node",
-        "inputs": ["data"],
-        "outputs": ["transformed_data"],
-        "config_fields": {
-            "transform_type": {
-                "type": "select",
-                "label": "转换类型",
-                "options": ["json_to_text", "text_to_json", "extract_json", "merge"],
-                "default": "json_to_text"
-            },
-            "json_path": {
-                "type": "text",
-                "label": "JSON路径",
-                "default": "",
-                "help": "例如: data.items[0].name"
-            }
-        }
-    }
-}
-
 # 自定义样式
 st.markdown("""
 <style>
@@ -373,8 +95,9 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # 初始化session state
-if 'workflows' not in st.session_state:
-    st.session_state.workflows = []
+if 'workflow_page_cursors' not in st.session_state:
+    # 已访问页面的起始游标，第一页为None
+    st.session_state.workflow_page_cursors = [None]
 if 'current_workflow' not in st.session_state:
     st.session_state.current_workflow = None
 if 'api_key' not in st.session_state:
@@ -395,476 +118,122 @@ if 'execution_log' not in st.session_state:
     st.session_state.execution_log = []
 if 'node_outputs' not in st.session_state:
     st.session_state.node_outputs = {}
+if 'node_reuse' not in st.session_state:
+    st.session_state.node_reuse = {}
+if 'active_run_id' not in st.session_state:
+    st.session_state.active_run_id = None
+    st.session_state.active_run_finalized = True
 
-# 节点执行器函数
-class WorkflowExecutor:
-    def __init__(self, workflow: Dict[str, Any], api_key: str):
-        self.workflow = workflow
-        self.api_key = api_key
-        self.node_outputs = {}
-        self.execution_log = []
-        
-    def log(self, message: str, level: str = "INFO"):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] [{level}] {message}"
-        self.execution_log.append(log_entry)
-        st.session_state.execution_log.append(log_entry)
-    
-    async def execute_start_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"开始节点 '{node['name']}' 执行")
-        config = node.get('config', {})
-        
-        # 获取用户输入
-        if 'user_input' in inputs:
-            output = inputs['user_input']
-        else:
-            output = st.session_state.get('workflow_input', '')
-        
-        self.log(f"输入内容: {output[:100]}...")
-        return {"output": output}
-    
-    async def execute_end_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"结束节点 '{node['name']}' 执行")
-        input_value = inputs.get('input', '')
-        config = node.get('config', {})
-        
-        # 格式化输出
-        output_format = config.get('output_format', 'text')
-        if output_format == 'json' and isinstance(input_value, str):
-            try:
-                input_value = json.loads(input_value)
-            except:
-                pass
-        
-        self.log(f"最终输出: {str(input_value)[:100]}...")
-        return {"output": input_value}
-    
-    async def execute_llm_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"LLM节点 '{node['name']}' 开始执行")
-        config = node.get('config', {})
-        
-        # 构建提示词
-        system_prompt = config.get('system_prompt', '你是一个有帮助的AI助手。')
-        user_prompt_template = config.get('user_prompt_template', '{input}')
-        
-        # 替换模板中的变量
-        user_prompt = user_prompt_template
-        for key, value in inputs.items():
-            user_prompt = user_prompt.replace(f"{{{key}}}", str(value))
-        
-        # 调用API
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            model = config.get('model', 'gpt-3.5-turbo')
-            # 映射模型名称到OpenRouter格式
-            model_mapping = {
-                'gpt-3.5-turbo': 'openai/gpt-3.5-turbo',
-                'gpt-4': 'openai/gpt-4',
-                'claude-3': 'anthropic/claude-3-sonnet',
-                'deepseek-chat': 'deepseek/deepseek-chat'
-            }
-            model = model_mapping.get(model, model)
-            
-            data = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": config.get('temperature', 0.7),
-                "max_tokens": config.get('max_tokens', 1000)
-            }
-            
-            self.log(f"调用模型: {model}")
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                text = result['choices'][0]['message']['content']
-                tokens = result.get('usage', {}).get('total_tokens', 0)
-                self.log(f"LLM响应成功，使用tokens: {tokens}")
-                return {"text": text, "tokens_used": tokens}
-            else:
-                raise Exception(f"API调用失败: {response.status_code} - {response.text}")
-                
-        except Exception as e:
-            self.log(f"LLM节点执行失败: {str(e)}", "ERROR")
-            raise e
-    
-    async def execute_web_search_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"网络搜索节点 '{node['name']}' 开始执行")
-        config = node.get('config', {})
-        query = inputs.get('query', '')
-        
-        num_results = config.get('num_results', 5)
-        search_type = config.get('search_type', 'general')
-        
-        self.log(f"搜索查询: {query}")
-        self.log(f"搜索类型: {search_type}, 结果数: {num_results}")
-        
-        # 使用TAVILY API进行搜索
-        try:
-            # 检查TAVILY API密钥
-            tavily_key = st.session_state.get('tavily_api_key', '')
-            if not tavily_key:
-                raise Exception("未配置TAVILY API密钥，请在侧边栏配置")
-            
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "api_key": tavily_key,
-                "query": query,
-                "max_results": num_results,
-                "search_depth": config.get('search_depth', 'basic'),
-                "include_answer": True,
-                "include_raw_content": False,
-                "include_images": False
-            }
-            
-            # 根据搜索类型添加额外参数
-            if search_type == "news":
-                data["topic"] = "news"
-                data["days"] = config.get('days', 7)
-            elif search_type == "academic":
-                data["include_domains"] = ["arxiv.org", "scholar.google.com", "pubmed.ncbi.nlm.nih.gov", "ieee.org"]
-            
-            # 添加时间范围
-            if config.get('days'):
-                data["days"] = config.get('days', 30)
-            
-            response = requests.post(
-                "https://api.tavily.com/search",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result_data = response.json()
-                
-                # 处理TAVILY返回的结果
-                results = []
-                urls = []
-                
-                # 如果有答案，添加到结果中
-                if result_data.get('answer'):
-                    results.append({
-                        'title': 'AI Generated Answer',
-                        'snippet': result_data['answer'],
-                        'url': ''
-                    })
-                
-                # 处理搜索结果
-                for item in result_data.get('results', [])[:num_results]:
-                    results.append({
-                        'title': item.get('title', ''),
-                        'snippet': item.get('content', ''),
-                        'url': item.get('url', ''),
-                        'score': item.get('score', 0)
-                    })
-                    urls.append(item.get('url', ''))
-                
-                self.log(f"搜索完成，找到 {len(results)} 个结果")
-                return {"results": results, "urls": urls}
-            else:
-                error_msg = f"TAVILY API调用失败: {response.status_code}"
-                if response.text:
-                    error_msg += f" - {response.text}"
-                raise Exception(error_msg)
-                
-        except Exception as e:
-            self.log(f"搜索失败: {str(e)}", "ERROR")
-            # 返回错误信息而不是模拟结果
-            raise e
-    
-    async def execute_http_request_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"HTTP请求节点 '{node['name']}' 开始执行")
-        config = node.get('config', {})
-        
-        # 构建URL
-        url_template = config.get('url_template', '')
-        url = url_template
-        for key, value in inputs.items():
-            url = url.replace(f"{{{key}}}", str(value))
-        
-        method = config.get('method', 'GET')
-        headers = config.get('headers', {})
-        timeout = config.get('timeout', 30)
-        
-        self.log(f"发送 {method} 请求到: {url}")
-        
-        try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                timeout=timeout,
-                params=inputs.get('params', {})
-            )
-            
-            self.log(f"响应状态码: {response.status_code}")
-            
-            # 尝试解析JSON
-            try:
-                response_data = response.json()
-            except:
-                response_data = response.text
-            
-            return {
-                "response": response_data,
-                "status_code": response.status_code
-            }
-        except Exception as e:
-            self.log(f"HTTP请求失败: {str(e)}", "ERROR")
-            raise e
-    
-    async def execute_code_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"代码执行节点 '{node['name']}' 开始执行")
-        config = node.get('config', {})
-        code = config.get('code', '')
-        
-        # 创建执行环境
-        local_vars = {'input': inputs.get('input', '')}
-        global_vars = {
-            'json': json,
-            're': re,
-            'datetime': datetime,
-            'str': str,
-            'int': int,
-            'float': float,
-            'len': len,
-            'list': list,
-            'dict': dict
-        }
-        
-        try:
-            # 执行代码
-            exec(code, global_vars, local_vars)
-            output = local_vars.get('output', '')
-            self.log(f"代码执行成功")
-            return {"output": output}
-        except Exception as e:
-            self.log(f"代码执行失败: {str(e)}", "ERROR")
-            raise e
-    
-    async def execute_condition_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"条件判断节点 '{node['name']}' 开始执行")
-        config = node.get('config', {})
-        
-        input_value = inputs.get('input', '')
-        condition = config.get('condition', 'True')
-        
-        # 创建执行环境
-        local_vars = {'input': input_value}
-        
-        try:
-            # 评估条件
-            result = eval(condition, {"__builtins__": {}}, local_vars)
-            self.log(f"条件 '{condition}' 评估结果: {result}")
-            
-            if result:
-                output = config.get('true_value', '{input}').replace('{input}', str(input_value))
-                return {"true_output": output, "false_output": None}
-            else:
-                output = config.get('false_value', '').replace('{input}', str(input_value))
-                return {"true_output": None, "false_output": output}
-        except Exception as e:
-            self.log(f"条件评估失败: {str(e)}", "ERROR")
-            raise e
-    
-    async def execute_text_processing_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"文本处理节点 '{node['name']}' 开始执行")
-        config = node.get('config', {})
-        
-        text = str(inputs.get('text', ''))
-        operation = config.get('operation', 'extract')
-        pattern = config.get('pattern', '')
-        
-        try:
-            if operation == 'extract':
-                matches = re.findall(pattern, text) if pattern else [text]
-                result = '\n'.join(matches)
-            elif operation == 'replace':
-                parts = pattern.split('|')
-                if len(parts) == 2:
-                    result = text.replace(parts[0], parts[1])
-                else:
-                    result = text
-            elif operation == 'split':
-                result = text.split(pattern or ' ')
-            elif operation == 'join':
-                if isinstance(text, list):
-                    result = (pattern or ' ').join(text)
-                else:
-                    result = text
-            elif operation == 'format':
-                template = config.get('template', '{text}')
-                result = template.replace('{text}', text)
-            else:
-                result = text
-            
-            self.log(f"文本处理完成: {operation}")
-            return {"processed_text": result}
-        except Exception as e:
-            self.log(f"文本处理失败: {str(e)}", "ERROR")
-            raise e
-    
-    async def execute_data_transform_node(self, node: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
-        self.log(f"数据转换节点 '{node['name']}' 开始执行")
-        config = node.get('config', {})
-        
-        data = inputs.get('data', '')
-        transform_type = config.get('transform_type', 'json_to_text')
-        
-        try:
-            if transform_type == 'json_to_text':
-                if isinstance(data, dict) or isinstance(data, list):
-                    result = json.dumps(data, ensure_ascii=False, indent=2)
-                else:
-                    result = str(data)
-            elif transform_type == 'text_to_json':
-                if isinstance(data, str):
-                    result = json.loads(data)
-                else:
-                    result = data
-            elif transform_type == 'extract_json':
-                # 从文本中提取JSON
-                if isinstance(data, str):
-                    json_match = re.search(r'\{.*\}|\[.*\]', data, re.DOTALL)
-                    if json_match:
-                        result = json.loads(json_match.group())
-                    else:
-                        result = {}
-                else:
-                    result = data
-            else:
-                result = data
-            
-            self.log(f"数据转换完成: {transform_type}")
-            return {"transformed_data": result}
-        except Exception as e:
-            self.log(f"数据转换失败: {str(e)}", "ERROR")
-            raise e
-    
-    async def execute_node(self, node: Dict[str, Any]) -> Dict[str, Any]:
-        """执行单个节点"""
-        node_type = NodeType(node['type'])
-        node_config = NODE_CONFIGS.get(node_type, {})
-        
-        # 收集输入
-        inputs = {}
-        for input_name in node_config.get('inputs', []):
-            # 查找连接到此输入的节点输出
-            for other_node in self.workflow['nodes']:
-                for conn in other_node.get('connections', []):
-                    if conn['target_node_id'] == node['id'] and conn.get('target_input') == input_name:
-                        source_output = conn.get('source_output', 'output')
-                        if other_node['id'] in self.node_outputs:
-                            inputs[input_name] = self.node_outputs[other_node['id']].get(source_output)
-                            break
-        
-        # 执行节点
-        executor_name = node_config.get('executor', '')
-        if hasattr(self, executor_name):
-            executor = getattr(self, executor_name)
-            outputs = await executor(node, inputs)
-            self.node_outputs[node['id']] = outputs
-            return outputs
-        else:
-            self.log(f"未找到节点类型 {node_type.value} 的执行器", "ERROR")
-            raise Exception(f"未实现的节点类型: {node_type.value}")
-    
-    async def execute(self, user_input: str = "") -> Any:
-        """执行整个工作流"""
-        self.log("开始执行工作流", "INFO")
-        st.session_state.node_outputs = {}
-        
-        # 设置初始输入
-        if user_input:
-            st.session_state.workflow_input = user_input
-            
-        # 初始化所有节点状态
-        for node in self.workflow['nodes']:
-            st.session_state.execution_state[node['id']] = NodeStatus.PENDING
-        
-        # 找到开始节点
-        start_nodes = [n for n in self.workflow['nodes'] if n['type'] == 'start']
-        if not start_nodes:
-            self.log("未找到开始节点", "ERROR")
-            raise Exception("工作流必须包含开始节点")
-        
-        # 使用拓扑排序确定执行顺序
-        executed = set()
-        to_execute = [start_nodes[0]['id']]
-        
-        while to_execute:
-            node_id = to_execute.pop(0)
-            if node_id in executed:
-                continue
-                
-            node = next((n for n in self.workflow['nodes'] if n['id'] == node_id), None)
-            if not node:
-                continue
-            
-            # 检查所有依赖是否已执行
-            dependencies_met = True
-            for other_node in self.workflow['nodes']:
-                for conn in other_node.get('connections', []):
-                    if conn['target_node_id'] == node_id and other_node['id'] not in executed:
-                        dependencies_met = False
-                        break
-                if not dependencies_met:
-                    break
-            
-            if not dependencies_met:
-                to_execute.append(node_id)
-                continue
-            
-            # 执行节点
-            try:
-                st.session_state.execution_state[node_id] = NodeStatus.RUNNING
-                outputs = await self.execute_node(node)
-                st.session_state.execution_state[node_id] = NodeStatus.SUCCESS
-                executed.add(node_id)
-                
-                # 添加下游节点到执行队列
-                for conn in node.get('connections', []):
-                    if conn['target_node_id'] not in executed:
-                        to_execute.append(conn['target_node_id'])
-                        
-            except Exception as e:
-                st.session_state.execution_state[node_id] = NodeStatus.FAILED
-                self.log(f"节点 '{node['name']}' 执行失败: {str(e)}", "ERROR")
-                raise e
-        
-        # 获取结束节点的输出
-        end_nodes = [n for n in self.workflow['nodes'] if n['type'] == 'end']
-        if end_nodes and end_nodes[0]['id'] in self.node_outputs:
-            final_output = self.node_outputs[end_nodes[0]['id']].get('output')
-            self.log(f"工作流执行完成", "INFO")
-            return final_output
+# 后台运行期间页面的刷新间隔（秒）
+RUN_POLL_INTERVAL = 0.5
+
+# 生成工作流使用的模型
+GENERATION_MODEL = "openai/gpt-3.5-turbo"
+# 预设模板：名称 -> 需求描述
+WORKFLOW_TEMPLATES = {
+    "网络搜索助手": "搜索网络上的最新信息并生成总结报告",
+    "API数据处理": "调用外部API获取数据，处理后生成分析结果",
+    "智能问答系统": "根据用户问题，搜索相关信息并生成准确回答",
+    "内容创作工具": "根据主题搜索资料，生成高质量的文章或报告",
+    "数据转换管道": "将输入数据进行格式转换和处理"
+}
+# 预设模板对应的工作流，创建生成缓存时预先写入
+TEMPLATE_WORKFLOWS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workflow_templates.json")
+
+@st.cache_resource
+def get_workflow_store() -> WorkflowStore:
+    """进程内共享的工作流存储"""
+    return WorkflowStore(os.path.join(DATA_DIR, "workflows.sqlite3"))
+
+@st.cache_resource
+def get_dispatcher() -> ProviderDispatcher:
+    """进程内共享的限流/熔断状态，所有会话的外部调用共用同一配额"""
+    return ProviderDispatcher()
+
+@st.cache_resource
+def get_llm_cache() -> ResponseCache:
+    """进程内共享的LLM响应缓存"""
+    return ResponseCache(os.path.join(DATA_DIR, "llm_cache.sqlite3"), namespace="llm")
+
+@st.cache_resource
+def get_search_cache() -> ResponseCache:
+    """进程内共享的网络搜索结果缓存，多个用户搜索相同内容时只调用一次TAVILY"""
+    return ResponseCache(os.path.join(DATA_DIR, "search_cache.sqlite3"), namespace="search")
+
+@st.cache_resource
+def get_generation_cache() -> ResponseCache:
+    """进程内共享的工作流生成缓存，预设模板的工作流在创建时写入且不过期"""
+    cache = ResponseCache(os.path.join(DATA_DIR, "generation_cache.sqlite3"), namespace="generation",
+                          max_disk_entries=500)
+    with open(TEMPLATE_WORKFLOWS_PATH, 'r', encoding='utf-8') as f:
+        template_workflows = json.load(f)
+    for name, prompt in WORKFLOW_TEMPLATES.items():
+        key = make_cache_key(build_generation_request(prompt))
+        # 已有的条目（包括重新生成的模板）保留不动
+        if name in template_workflows and cache.get_entry(key) is None:
+            cache.set(key, template_workflows[name], ttl=0)
+    return cache
+
+@st.cache_resource
+def get_run_journal() -> RunJournal:
+    """进程内共享的运行日志，保存每次运行各节点的检查点"""
+    return RunJournal(os.path.join(DATA_DIR, "runs.sqlite3"))
+
+@st.cache_resource
+def get_code_sandbox() -> CodeSandbox:
+    """进程内共享的代码执行进程池，启动时预热"""
+    sandbox = CodeSandbox()
+    sandbox.warm_up()
+    return sandbox
+
+@st.cache_resource
+def get_run_worker() -> RunWorker:
+    """进程内常驻的执行线程，所有会话的运行都提交到这里，共用一个连接池"""
+    return RunWorker()
+
+def render_execution_log(container, logs: List[str]):
+    log_html = '<div class="execution-log">'
+    for log in logs[-20:]:  # 显示最新的20条
+        if "[ERROR]" in log:
+            log_html += f'<div style="color: #ef4444;">{log}</div>'
+        elif "[WARNING]" in log:
+            log_html += f'<div style="color: #f59e0b;">{log}</div>'
+        elif "[INFO]" in log:
+            log_html += f'<div style="color: #10b981;">{log}</div>'
         else:
-            self.log("未找到有效的输出", "WARNING")
-            return None
+            log_html += f'<div>{log}</div>'
+    log_html += '</div>'
+    container.markdown(log_html, unsafe_allow_html=True)
 
-# 增强的API调用函数
-def call_openrouter_api(prompt: str, api_key: str) -> Dict[str, Any]:
-    """调用 OpenRouter API 生成工作流结构"""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+# 同步当前会话的后台运行状态；运行结束后保存输出、追踪和可复用节点（每次运行只处理一次）
+active_run = get_run_worker().get(st.session_state.active_run_id) if st.session_state.active_run_id else None
+if active_run is not None:
+    st.session_state.execution_state = active_run.node_status
+    st.session_state.execution_log = active_run.logs
+    if active_run.done and not st.session_state.active_run_finalized:
+        st.session_state.active_run_finalized = True
+        context = active_run.context
+        st.session_state.last_run_id = context.run_id
+        st.session_state.node_outputs = context.node_outputs
+        st.session_state.last_trace = context.trace
+        # 失败的运行同样保留已完成节点，下次执行可直接复用
+        st.session_state.node_reuse = {**st.session_state.node_reuse, **context.reusable_outputs()}
+        if active_run.result is not None:
+            # 保存执行历史
+            if 'execution_history' not in st.session_state:
+                st.session_state.execution_history = []
+            st.session_state.execution_history.append({
+                'workflow_name': active_run.workflow_name,
+                'input': context.inputs.get('user_input', ''),
+                'output': active_run.result,
+                'timestamp': datetime.now().isoformat(),
+                'logs': active_run.logs
+            })
+
+# 生成工作流的请求
+def build_generation_request(prompt: str) -> Dict[str, Any]:
+    """生成工作流的请求体；需求描述先合并空白，等价的描述得到相同的请求和缓存键"""
+    prompt = " ".join(prompt.split())
     
     # 定义可用的节点类型及其使用场景
     node_types_description = """
@@ -873,17 +242,23 @@ def call_openrouter_api(prompt: str, api_key: str) -> Dict[str, Any]:
 - end: 工作流终点，输出最终结果
 - llm: 调用大语言模型进行文本生成、分析、总结等
 - web_search: 搜索互联网获取最新信息（用于需要实时数据的场景）
+- knowledge_retrieval: 从本地知识库检索相关内容，输入端口 query，输出端口 results 和 context（可直接连接到LLM的context）
 - http_request: 调用外部API获取数据（用于集成第三方服务）
 - code: 执行Python代码进行数据处理、计算等
 - condition: 条件判断，根据条件选择不同的执行路径
 - text_processing: 文本处理，如提取、替换、分割等
 - data_transform: 数据格式转换，如JSON和文本之间的转换
+- loop: 对列表（如搜索结果、分割后的文本）中的每个元素并行执行子工作流，输入端口 items，输出端口 results（按原顺序的结果列表）和 count；
+  config.body 是完整的子工作流 {"nodes": [...]}，必须包含 start 和 end 节点，start 的输出即当前元素；
+  config.concurrency 为并发数，config.break_condition 为可选的提前结束条件（Python表达式，input 为当前元素的结果）
 
 重要提示：
 1. 如果用户需要搜索网络信息、获取最新数据，必须使用 web_search 节点
 2. 如果需要调用外部服务或API，使用 http_request 节点
 3. 需要复杂数据处理时，使用 code 节点
 4. 每个节点的连接必须指定源输出端口和目标输入端口
+5. 需要对多个条目逐一处理（如逐条总结搜索结果）时，使用 loop 节点，不要为每个条目单独创建节点
+6. llm 节点的 user_prompt_template 只能引用输入端口 {prompt} 和 {context}，http_request 节点的 url_template 只能引用 {url} 和 {params}
 """
     
     system_prompt = f"""你是一个AI工作流设计专家。请根据用户的需求描述，生成一个结构化的工作流。
@@ -937,16 +312,39 @@ def call_openrouter_api(prompt: str, api_key: str) -> Dict[str, Any]:
 示例3 - 条件处理工作流：
 用户需求："根据输入长度选择不同的处理方式"
 应该包含：start → condition → (分支1: text_processing) 或 (分支2: llm) → end
+
+示例4 - 逐条处理工作流：
+用户需求："搜索相关新闻并逐条总结"
+应该包含：start → web_search → loop（body: start → llm → end）→ llm → end
 """
     
-    data = {
-        "model": "openai/gpt-3.5-turbo",
+    return {
+        "model": GENERATION_MODEL,
         "messages": [
             {"role": "system", "content": system_prompt + "\n\n" + examples},
             {"role": "user", "content": f"请为以下需求生成工作流结构：{prompt}\n\n请确保充分利用各种节点类型，特别是当用户需要搜索信息时使用web_search节点。"}
         ],
         "temperature": 0.7
     }
+
+# 增强的API调用函数
+def call_openrouter_api(prompt: str, api_key: str, cache: Optional[ResponseCache] = None,
+                        use_cache: bool = True) -> Dict[str, Any]:
+    """调用 OpenRouter API 生成工作流结构；传入 cache 时相同的需求直接返回缓存的工作流"""
+    data = build_generation_request(prompt)
+    cache_key = make_cache_key(data)
+    if cache is not None and use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            # 返回副本，编辑工作流不会修改缓存中的对象
+            return {"success": True, "workflow": copy.deepcopy(cached), "cached": True}
+    if not api_key:
+        return {"success": False, "error": "请先在侧边栏配置OpenRouter API密钥"}
+    
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
     
     try:
         response = requests.post(
@@ -959,17 +357,21 @@ def call_openrouter_api(prompt: str, api_key: str) -> Dict[str, Any]:
         if response.status_code == 200:
             result = response.json()
             content = result['choices'][0]['message']['content']
-            # 提取JSON部分
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start != -1 and end != 0:
-                workflow_json = json.loads(content[start:end])
+            # 提取包含节点列表的JSON对象，跳过说明文字中的其他JSON片段
+            workflow_json = next((value for value in extract_json_values(content)
+                                  if isinstance(value, dict) and isinstance(value.get('nodes'), list)), None)
+            if workflow_json is not None:
                 # 为每个节点生成唯一ID（如果没有）
                 for i, node in enumerate(workflow_json['nodes']):
-                    if 'id' not in node or not node['id']:
+                    if isinstance(node, dict) and not node.get('id'):
                         node['id'] = f"node_{i+1}"
-                    if 'position' not in node:
-                        node['position'] = {"x": 100 + i * 200, "y": 100}
+                # 校验并补全默认值，不合法的工作流不会写入缓存
+                try:
+                    workflow_json = copy.deepcopy(load_workflow(workflow_json).workflow)
+                except WorkflowValidationError as e:
+                    return {"success": False, "error": f"生成的工作流无效: {e}"}
+                if cache is not None:
+                    cache.set(cache_key, copy.deepcopy(workflow_json))
                 return {"success": True, "workflow": workflow_json}
             else:
                 return {"success": False, "error": "无法解析工作流结构"}
@@ -1481,15 +883,7 @@ with st.sidebar:
     
     # 预设模板
     st.header("📚 工作流模板")
-    templates = {
-        "网络搜索助手": "搜索网络上的最新信息并生成总结报告",
-        "API数据处理": "调用外部API获取数据，处理后生成分析结果",
-        "智能问答系统": "根据用户问题，搜索相关信息并生成准确回答",
-        "内容创作工具": "根据主题搜索资料，生成高质量的文章或报告",
-        "数据转换管道": "将输入数据进行格式转换和处理"
-    }
-    
-    for name, desc in templates.items():
+    for name, desc in WORKFLOW_TEMPLATES.items():
         if st.button(f"🎯 {name}", use_container_width=True, help=desc):
             st.session_state.template_prompt = desc
     
@@ -1535,18 +929,23 @@ with tab1:
     
     col1, col2 = st.columns([3, 1])
     with col1:
+        regenerate = st.checkbox(
+            "🔄 重新生成（不使用缓存）",
+            value=False,
+            help="相同的需求默认直接返回上次生成的工作流，勾选后重新调用模型生成新的版本"
+        )
         if st.button("🎨 生成工作流", type="primary", use_container_width=True):
-            if not st.session_state.api_key:
-                st.error("请先在侧边栏配置OpenRouter API密钥")
-            elif not user_prompt:
+            if not user_prompt:
                 st.error("请输入您的需求描述")
             else:
                 with st.spinner("正在生成工作流..."):
-                    result = call_openrouter_api(user_prompt, st.session_state.api_key)
+                    # 命中缓存时（包括预设模板）无需API密钥
+                    result = call_openrouter_api(user_prompt, st.session_state.api_key,
+                                                 cache=get_generation_cache(), use_cache=not regenerate)
                     
                     if result['success']:
                         st.session_state.current_workflow = result['workflow']
-                        st.success("工作流生成成功！")
+                        st.success("工作流生成成功！" + ("（使用缓存）" if result.get('cached') else ""))
                         st.info("您可以在'编辑工作流'标签页中调整节点和连接")
                     else:
                         st.error(f"生成失败：{result['error']}")
@@ -1612,10 +1011,14 @@ with tab2:
                                     help=field_def.get('help')
                                 )
                             elif field_def['type'] == 'select':
+                                options = list(field_def['options'])
+                                if field_def.get('allow_custom') and current_value not in options:
+                                    # 允许自定义取值的字段（如模型名）保留当前值，不被替换成第一个选项
+                                    options.append(current_value)
                                 new_value = st.selectbox(
                                     field_def['label'],
-                                    options=field_def['options'],
-                                    index=field_def['options'].index(current_value) if current_value in field_def['options'] else 0
+                                    options=options,
+                                    index=options.index(current_value) if current_value in options else 0
                                 )
                             elif field_def['type'] == 'number':
                                 new_value = st.number_input(
@@ -1639,6 +1042,18 @@ with tab2:
                                     height=150,
                                     help=field_def.get('help')
                                 )
+                            elif field_def['type'] == 'json':
+                                json_text = st.text_area(
+                                    field_def['label'],
+                                    value=json.dumps(current_value, ensure_ascii=False, indent=2),
+                                    height=200,
+                                    help=field_def.get('help')
+                                )
+                                try:
+                                    new_value = json.loads(json_text)
+                                except json.JSONDecodeError as e:
+                                    st.error(f"{field_def['label']} 不是有效的JSON: {e}")
+                                    new_value = current_value
                             else:
                                 new_value = current_value
                             
@@ -1649,12 +1064,9 @@ with tab2:
         col1, col2, col3 = st.columns([1, 1, 1])
         with col1:
             if st.button("💾 保存工作流", type="primary"):
-                workflow = st.session_state.current_workflow
-                workflow['updated_at'] = datetime.now().isoformat()
-                if workflow not in st.session_state.workflows:
-                    workflow['created_at'] = datetime.now().isoformat()
-                    st.session_state.workflows.append(workflow)
-                st.success("工作流已保存！")
+                saved = get_workflow_store().save(st.session_state.current_workflow)
+                st.session_state.current_workflow = saved
+                st.success(f"工作流已保存！（版本 {saved['version']}）")
         
         with col2:
             if st.button("📥 导出JSON"):
@@ -1685,82 +1097,99 @@ with tab3:
             height=100,
             placeholder="输入您要处理的内容..."
         )
+
+        st.session_state.current_workflow['max_concurrency'] = st.number_input(
+            "最大并发节点数",
+            min_value=1,
+            max_value=32,
+            value=int(st.session_state.current_workflow.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)),
+            help="没有数据依赖的分支会同时执行，此处限制同时运行的节点数量"
+        )
         
-        # 执行按钮
-        if st.button("🚀 开始执行", type="primary", use_container_width=True):
-            if not user_input and st.session_state.current_workflow['nodes'][0]['type'] == 'start':
+        reuse_outputs = st.checkbox(
+            "♻️ 复用未变化节点的输出",
+            value=True,
+            help="配置和输入都与上次运行相同的节点直接使用上次的结果，只重新执行修改过的节点及其下游"
+        )
+
+        # 执行前校验工作流，结构错误在调用任何付费接口之前暴露
+        try:
+            loaded_workflow = load_workflow(st.session_state.current_workflow)
+        except WorkflowValidationError as e:
+            loaded_workflow = None
+            st.error("工作流校验失败，请在'编辑工作流'标签页中修正：\n" +
+                     "\n".join(f"- {error}" for error in getattr(e, 'errors', [str(e)])))
+
+        # 上次运行失败时可以从失败的节点继续，已完成的节点使用检查点中的输出
+        # （当前会话的运行结束前不显示，避免重复提交同一运行）
+        resume_run = None
+        last_run_id = st.session_state.get('last_run_id')
+        run_in_progress = active_run is not None and not active_run.done
+        if last_run_id and not run_in_progress:
+            last_run = get_run_journal().get_run(last_run_id)
+            if last_run is not None and last_run['status'] == NodeStatus.FAILED.value:
+                st.warning(f"上次运行失败：{last_run['error']}")
+                if st.button("🔁 从失败处继续", use_container_width=True,
+                             help="使用上次运行的输入，跳过已成功的节点，从失败的节点开始重新执行"):
+                    resume_run = last_run
+
+        # 执行按钮（当前会话的运行结束前不能再次提交）
+        start_clicked = st.button("🚀 开始执行", type="primary", use_container_width=True,
+                                  disabled=run_in_progress or loaded_workflow is None)
+        if (start_clicked or resume_run is not None) and loaded_workflow is not None:
+            if resume_run is None and not user_input and st.session_state.current_workflow['nodes'][0]['type'] == 'start':
                 st.error("请提供输入内容")
             else:
-                # 清空之前的日志
-                st.session_state.execution_log = []
+                context = ExecutionContext(
+                    inputs={'user_input': user_input},
+                    secrets={
+                        'openrouter_api_key': st.session_state.api_key,
+                        'tavily_api_key': st.session_state.tavily_api_key
+                    },
+                    reuse=st.session_state.node_reuse if reuse_outputs else {},
+                    record_fingerprints=True
+                )
+                executor = WorkflowExecutor(loaded_workflow.workflow, llm_cache=get_llm_cache(),
+                                            dispatcher=get_dispatcher(), code_sandbox=get_code_sandbox(),
+                                            search_cache=get_search_cache(), journal=get_run_journal(),
+                                            plan=loaded_workflow.plan)
+                # 提交到后台执行线程，页面只轮询状态
+                st.session_state.active_run_id = get_run_worker().submit(
+                    executor, context, resume_run_id=resume_run['run_id'] if resume_run is not None else None
+                )
+                st.session_state.active_run_finalized = False
+                st.rerun()
+        
+        # 当前会话的运行：实时日志和结果，运行期间定时刷新
+        if active_run is not None:
+            with st.container():
+                col1, col2 = st.columns([2, 1])
                 
-                # 执行工作流
-                executor = WorkflowExecutor(st.session_state.current_workflow, st.session_state.api_key)
+                with col1:
+                    st.markdown("### 执行日志")
+                    render_execution_log(st.empty(), active_run.logs)
                 
-                # 创建执行容器
-                with st.container():
-                    col1, col2 = st.columns([2, 1])
-                    
-                    with col1:
-                        st.markdown("### 执行日志")
-                        log_container = st.empty()
-                    
-                    with col2:
-                        st.markdown("### 输出结果")
-                        result_container = st.empty()
-                    
-                    # 异步执行
-                    try:
-                        # 使用异步执行
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        
-                        # 更新日志显示
-                        def update_log():
-                            log_html = '<div class="execution-log">'
-                            for log in st.session_state.execution_log[-20:]:  # 显示最新的20条
-                                if "[ERROR]" in log:
-                                    log_html += f'<div style="color: #ef4444;">{log}</div>'
-                                elif "[WARNING]" in log:
-                                    log_html += f'<div style="color: #f59e0b;">{log}</div>'
-                                elif "[INFO]" in log:
-                                    log_html += f'<div style="color: #10b981;">{log}</div>'
-                                else:
-                                    log_html += f'<div>{log}</div>'
-                            log_html += '</div>'
-                            log_container.markdown(log_html, unsafe_allow_html=True)
-                        
-                        # 开始执行
-                        update_log()
-                        result = loop.run_until_complete(executor.execute(user_input))
-                        
+                with col2:
+                    st.markdown("### 输出结果")
+                    if not active_run.done:
+                        st.info(f"⏳ 执行中... 已用时 {time.time() - active_run.started_at:.1f}s")
+                        node_names = {n['id']: n['name'] for n in st.session_state.current_workflow['nodes']}
+                        for node_id, text in list(active_run.streamed_text.items()):
+                            st.markdown(f"**{node_names.get(node_id, node_id)}** 生成中...\n\n{text}")
+                        if st.button("⏹️ 取消运行", use_container_width=True):
+                            get_run_worker().cancel(active_run.run_id)
+                    elif active_run.status == NodeStatus.SUCCESS.value:
                         # 显示最终结果
-                        if result is not None:
-                            result_container.success("执行成功！")
-                            if isinstance(result, dict) or isinstance(result, list):
-                                result_container.json(result)
+                        if active_run.result is not None:
+                            st.success("执行成功！")
+                            if isinstance(active_run.result, dict) or isinstance(active_run.result, list):
+                                st.json(active_run.result)
                             else:
-                                result_container.write(result)
-                            
-                            # 保存执行历史
-                            if 'execution_history' not in st.session_state:
-                                st.session_state.execution_history = []
-                            st.session_state.execution_history.append({
-                                'workflow_name': st.session_state.current_workflow['name'],
-                                'input': user_input,
-                                'output': result,
-                                'timestamp': datetime.now().isoformat(),
-                                'logs': st.session_state.execution_log.copy()
-                            })
+                                st.write(active_run.result)
                         else:
-                            result_container.warning("执行完成，但没有输出结果")
-                        
-                        # 最终日志更新
-                        update_log()
-                        
-                    except Exception as e:
-                        st.error(f"执行失败：{str(e)}")
-                        update_log()
+                            st.warning("执行完成，但没有输出结果")
+                    else:
+                        st.error(f"执行失败：{active_run.error}")
                 
         # 显示节点输出
         if st.session_state.node_outputs:
@@ -1771,6 +1200,48 @@ with tab3:
                         st.write(f"**{node['name']}** ({node['type']})")
                         st.json(outputs)
                         st.divider()
+        
+        # 显示运行追踪
+        trace = st.session_state.get('last_trace')
+        if trace is not None and trace.spans:
+            with st.expander("⏱️ 运行追踪"):
+                summary = trace.summary()
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("总耗时", f"{summary['wall_time']:.2f}s")
+                col2.metric("Tokens", summary['tokens'])
+                col3.metric("缓存命中", summary['cache_hits'])
+                col4.metric("重试次数", summary['retries'])
+                st.table([
+                    {
+                        "节点": span.name,
+                        "类型": span.node_type,
+                        "状态": span.status,
+                        "排队(s)": round(span.queue_time, 3),
+                        "耗时(s)": round(span.wall_time, 3),
+                        "发送字节": span.bytes_out,
+                        "接收字节": span.bytes_in,
+                        "Tokens": span.tokens,
+                        "缓存命中": span.cache_hits,
+                        "重试": span.retries
+                    }
+                    for span in trace.spans.values()
+                ])
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.download_button(
+                        "📥 导出 Chrome Trace",
+                        data=json.dumps(trace.to_chrome_trace(), ensure_ascii=False),
+                        file_name=f"trace_{trace.run_id[:8]}.json",
+                        mime="application/json",
+                        help="可在 chrome://tracing 或 Perfetto 中打开"
+                    )
+                with col2:
+                    st.download_button(
+                        "📥 导出 OpenTelemetry JSON",
+                        data=json.dumps(trace.to_otel(), ensure_ascii=False),
+                        file_name=f"otel_{trace.run_id[:8]}.json",
+                        mime="application/json"
+                    )
     else:
         st.info("请先创建或选择一个工作流")
 
@@ -1778,28 +1249,45 @@ with tab3:
 with tab4:
     st.subheader("📚 已保存的工作流")
     
-    if st.session_state.workflows:
-        for idx, workflow in enumerate(st.session_state.workflows):
+    store = get_workflow_store()
+    cursors = st.session_state.workflow_page_cursors
+    workflows, next_cursor = store.list_page(DEFAULT_PAGE_SIZE, cursors[-1])
+    
+    if workflows:
+        st.caption(f"共 {store.count()} 个工作流，第 {len(cursors)} 页")
+        for workflow in workflows:
             with st.container():
                 col1, col2 = st.columns([3, 1])
                 
                 with col1:
                     st.markdown(f"### {workflow['name']}")
                     st.caption(workflow['description'])
-                    st.caption(f"创建时间: {workflow.get('created_at', 'Unknown')}")
-                    st.caption(f"节点数: {len(workflow['nodes'])}")
+                    st.caption(f"创建时间: {workflow['created_at']} | 更新时间: {workflow['updated_at']}")
+                    st.caption(f"节点数: {workflow['node_count']} | 版本: {workflow['version']}")
                 
                 with col2:
-                    if st.button("加载", key=f"load_{idx}"):
-                        st.session_state.current_workflow = workflow.copy()
+                    if st.button("加载", key=f"load_{workflow['id']}"):
+                        st.session_state.current_workflow = store.get(workflow['id'])
                         st.success("工作流已加载")
                         st.rerun()
                     
-                    if st.button("删除", key=f"delete_{idx}"):
-                        st.session_state.workflows.pop(idx)
+                    if st.button("删除", key=f"delete_{workflow['id']}"):
+                        store.delete(workflow['id'])
+                        st.session_state.workflow_page_cursors = [None]
                         st.rerun()
                 
                 st.divider()
+        
+        # 分页
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            if len(cursors) > 1 and st.button("⬅️ 上一页"):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            if next_cursor is not None and st.button("下一页 ➡️"):
+                cursors.append(next_cursor)
+                st.rerun()
     else:
         st.info("暂无保存的工作流")
     
@@ -1809,11 +1297,38 @@ with tab4:
     if uploaded_file:
         try:
             workflow = json.load(uploaded_file)
-            st.session_state.current_workflow = workflow
+            # 导入前校验全部节点和连接，保存补全默认值后的副本
+            st.session_state.current_workflow = copy.deepcopy(load_workflow(workflow).workflow)
             st.success("工作流导入成功！")
             st.rerun()
+        except WorkflowValidationError as e:
+            st.error("导入失败，工作流无效：\n" + "\n".join(f"- {error}" for error in getattr(e, 'errors', [str(e)])))
         except Exception as e:
             st.error(f"导入失败：{str(e)}")
+    
+    # 本地知识库
+    st.subheader("📖 知识库")
+    indexes = list_indexes(KNOWLEDGE_DIR)
+    for index_meta in indexes:
+        st.caption(f"**{index_meta['name']}** | 文档 {len(index_meta['documents'])} 个 | "
+                   f"片段 {index_meta['chunk_count']} 个 | 建立时间: {index_meta['built_at']}")
+    
+    kb_name = st.text_input("知识库名称", value="default", help="知识检索节点通过名称引用知识库，同名知识库会被覆盖")
+    kb_files = st.file_uploader("上传文档", type=['txt', 'md', 'json', 'csv'], accept_multiple_files=True)
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        kb_chunk_size = st.number_input("分块大小（字符）", value=DEFAULT_CHUNK_SIZE, min_value=100, max_value=4000)
+    with col2:
+        kb_dense = st.checkbox("生成向量（支持混合检索）", value=True)
+    if st.button("🔨 建立索引", disabled=not kb_files):
+        try:
+            documents = [(f.name, f.getvalue().decode('utf-8', errors='ignore')) for f in kb_files]
+            with st.spinner("正在建立索引..."):
+                index = KnowledgeIndex.build(index_path(KNOWLEDGE_DIR, kb_name), documents,
+                                             chunk_size=int(kb_chunk_size), dense=kb_dense)
+            st.success(f"知识库 '{kb_name}' 已建立，共 {index.chunk_count} 个片段")
+        except KnowledgeIndexError as e:
+            st.error(str(e))
 
 # 页脚
 st.divider()
@@ -1822,3 +1337,8 @@ st.markdown("""
     AI工作流构建平台 - 可执行版本 | 支持实时搜索、API调用、智能处理
 </div>
 """, unsafe_allow_html=True)
+
+# 后台运行未结束时定时刷新页面，显示最新的日志和状态
+if active_run is not None and not active_run.done:
+    time.sleep(RUN_POLL_INTERVAL)
+    st.rerun()
@@ -0,0 +1,1481 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+import tracing
+from code_sandbox import DEFAULT_MEMORY_LIMIT_MB, CodeSandbox, default_sandbox
+from condition_compiler import ConditionError, compile_condition
+from dispatch import ProviderDispatcher
+from http_client import AsyncHttpPool
+from json_extract import extract_json
+from knowledge_index import index_path, open_index
+from llm_batcher import LLMBatcher
+from port_value import PortValue, preview
+from prompt_template import CompiledTemplate, TemplateError, compile_template
+from response_cache import ResponseCache, make_cache_key
+from run_journal import RunJournal
+from tracing import RunTrace
+
+# 节点类型定义
+class NodeType(Enum):
+    START = "start"
+    END = "end"
+    LLM = "llm"
+    KNOWLEDGE_RETRIEVAL = "knowledge_retrieval"
+    HTTP_REQUEST = "http_request"
+    CODE = "code"
+    CONDITION = "condition"
+    TEXT_PROCESSING = "text_processing"
+    VARIABLE = "variable"
+    WEB_SEARCH = "web_search"
+    DATA_TRANSFORM = "data_transform"
+    LOOP = "loop"
+
+# 节点执行状态
+class NodeStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCESS = "success"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+# 工作流默认最大并发节点数
+DEFAULT_MAX_CONCURRENCY = 4
+
+# 本地数据目录（缓存等）
+DATA_DIR = os.environ.get("AIFLOW_DATA_DIR", ".aiflow")
+# 本地知识库索引目录
+KNOWLEDGE_DIR = os.path.join(DATA_DIR, "knowledge")
+
+# 搜索缓存按搜索类型设置的 (新鲜期, 过期后仍可使用旧结果的时长)，单位秒
+SEARCH_CACHE_TTL = {
+    "news": (15 * 60, 60 * 60),
+    "general": (6 * 3600, 24 * 3600),
+    "academic": (7 * 24 * 3600, 30 * 24 * 3600),
+}
+
+# 节点配置
+NODE_CONFIGS = {
+    NodeType.START: {
+        "name": "开始",
+        "icon": "▶️",
+        "color": "#e0f2fe",
+        "description": "工作流起点，接收用户输入",
+        "executor": "execute_start_node",
+        "inputs": [],
+        "outputs": ["output"],
+        "config_fields": {
+            "input_type": {
+                "type": "select",
+                "label": "输入类型",
+                "options": ["text", "json", "file"],
+                "default": "text"
+            },
+            "prompt": {
+                "type": "textarea",
+                "label": "提示信息",
+                "default": "请输入您的内容："
+            }
+        }
+    },
+    NodeType.END: {
+        "name": "结束",
+        "icon": "🏁",
+        "color": "#d1fae5",
+        "description": "工作流终点，输出最终结果",
+        "executor": "execute_end_node",
+        "inputs": ["input"],
+        "outputs": [],
+        "config_fields": {
+            "output_format": {
+                "type": "select",
+                "label": "输出格式",
+                "options": ["text", "json", "markdown"],
+                "default": "text"
+            }
+        }
+    },
+    NodeType.LLM: {
+        "name": "大语言模型",
+        "icon": "🧠",
+        "color": "#fef3c7",
+        "description": "调用AI模型处理文本",
+        "executor": "execute_llm_node",
+        "inputs": ["prompt", "context"],
+        "outputs": ["text", "tokens_used"],
+        "config_fields": {
+            "model": {
+                "type": "select",
+                "label": "模型",
+                "options": ["gpt-3.5-turbo", "gpt-4", "claude-3", "deepseek-chat"],
+                "default": "gpt-3.5-turbo",
+                # 也可以填写任意 OpenRouter 模型名
+                "allow_custom": True
+            },
+            "system_prompt": {
+                "type": "textarea",
+                "label": "系统提示词",
+                "default": "你是一个有帮助的AI助手。"
+            },
+            "user_prompt_template": {
+                "type": "textarea",
+                "label": "用户提示词模板",
+                "default": "{input}",
+                "help": "使用 {prompt}、{context} 引用输入（{input} 等同于 {prompt}），支持 {context[0].title} 形式的路径，{{ 和 }} 表示字面花括号"
+            },
+            "temperature": {
+                "type": "slider",
+                "label": "温度",
+                "min": 0.0,
+                "max": 2.0,
+                "default": 0.7,
+                "step": 0.1
+            },
+            "max_tokens": {
+                "type": "number",
+                "label": "最大令牌数",
+                "default": 1000,
+                "min": 100,
+                "max": 4000
+            },
+            "cache_mode": {
+                "type": "select",
+                "label": "响应缓存",
+                "options": ["enabled", "disabled"],
+                "default": "enabled",
+                "help": "相同模型、提示词和参数的请求直接复用缓存结果；需要多样化输出时请关闭"
+            },
+            "stream": {
+                "type": "select",
+                "label": "流式输出",
+                "options": ["enabled", "disabled"],
+                "default": "enabled",
+                "help": "在执行页面逐字显示模型输出"
+            },
+            "batch_mode": {
+                "type": "select",
+                "label": "批量调用",
+                "options": ["off", "concurrent", "packed"],
+                "default": "off",
+                "help": "批处理或循环中合并同时发生的相同配置调用: concurrent 限制并发逐条发送, packed 合并为一个请求后拆分结果；不适用于流式输出"
+            }
+        }
+    },
+    NodeType.WEB_SEARCH: {
+        "name": "网络搜索",
+        "icon": "🔍",
+        "color": "#e0e7ff",
+        "description": "搜索互联网获取实时信息",
+        "executor": "execute_web_search_node",
+        "inputs": ["query"],
+        "outputs": ["results", "urls"],
+        "config_fields": {
+            "search_depth": {
+                "type": "select",
+                "label": "搜索深度",
+                "options": ["basic", "advanced"],
+                "default": "basic",
+                "help": "basic: 快速搜索, advanced: 深度搜索"
+            },
+            "num_results": {
+                "type": "number",
+                "label": "结果数量",
+                "default": 5,
+                "min": 1,
+                "max": 10
+            },
+            "search_type": {
+                "type": "select",
+                "label": "搜索类型",
+                "options": ["general", "news", "academic"],
+                "default": "general",
+                "help": "general: 通用搜索, news: 新闻搜索, academic: 学术搜索"
+            },
+            "days": {
+                "type": "number",
+                "label": "时间范围（天）",
+                "default": 30,
+                "min": 1,
+                "max": 365,
+                "help": "搜索最近N天内的内容"
+            }
+        }
+    },
+    NodeType.KNOWLEDGE_RETRIEVAL: {
+        "name": "知识检索",
+        "icon": "📖",
+        "color": "#fff7ed",
+        "description": "从本地知识库检索相关内容",
+        "executor": "execute_knowledge_retrieval_node",
+        "inputs": ["query"],
+        "outputs": ["results", "context"],
+        "config_fields": {
+            "index_name": {
+                "type": "text",
+                "label": "知识库名称",
+                "default": "default",
+                "help": "在“我的工作流”页面上传文档建立的知识库"
+            },
+            "top_k": {
+                "type": "number",
+                "label": "返回片段数",
+                "default": 5,
+                "min": 1,
+                "max": 20
+            },
+            "search_mode": {
+                "type": "select",
+                "label": "检索方式",
+                "options": ["bm25", "hybrid"],
+                "default": "bm25",
+                "help": "bm25: 关键词检索, hybrid: 关键词 + 向量相似度"
+            }
+        }
+    },
+    NodeType.HTTP_REQUEST: {
+        "name": "HTTP请求",
+        "icon": "🌐",
+        "color": "#fce7f3",
+        "description": "调用外部API获取数据",
+        "executor": "execute_http_request_node",
+        "inputs": ["url", "params"],
+        "outputs": ["response", "status_code"],
+        "config_fields": {
+            "method": {
+                "type": "select",
+                "label": "请求方法",
+                "options": ["GET", "POST", "PUT", "DELETE"],
+                "default": "GET"
+            },
+            "url_template": {
+                "type": "text",
+                "label": "URL模板",
+                "default": "https://api.example.com/endpoint",
+                "help": "可以使用 {url}、{params} 插入输入值，支持 {params.id} 形式的路径"
+            },
+            "headers": {
+                "type": "json",
+                "label": "请求头",
+                "default": {"Content-Type": "application/json"}
+            },
+            "timeout": {
+                "type": "number",
+                "label": "超时时间（秒）",
+                "default": 30,
+                "min": 1,
+                "max": 300
+            }
+        }
+    },
+    NodeType.CODE: {
+        "name": "代码执行",
+        "icon": "💻",
+        "color": "#f0f9ff",
+        "description": "执行自定义Python代码处理数据",
+        "executor": "execute_code_node",
+        "inputs": ["input"],
+        "outputs": ["output"],
+        "config_fields": {
+            "code": {
+                "type": "code",
+                "label": "Python代码",
+                "default": """# 输入变量: input
+# 返回结果赋值给: output
+
+output = input.upper() if isinstance(input, str) else str(input)""",
+                "language": "python"
+            },
+            "timeout": {
+                "type": "number",
+                "label": "超时时间（秒）",
+                "default": 10,
+                "min": 1,
+                "max": 60
+            },
+            "memory_limit_mb": {
+                "type": "number",
+                "label": "内存上限（MB）",
+                "default": 256,
+                "min": 64,
+                "max": 4096
+            }
+        }
+    },
+    NodeType.CONDITION: {
+        "name": "条件判断",
+        "icon": "🔀",
+        "color": "#fdf4ff",
+        "description": "根据条件选择不同分支",
+        "executor": "execute_condition_node",
+        "inputs": ["input"],
+        "outputs": ["true_output", "false_output"],
+        # 分支节点：值为None的输出端口视为未选中的分支，只经由它可达的下游节点会被跳过
+        "branching": True,
+        "config_fields": {
+            "condition_type": {
+                "type": "select",
+                "label": "条件类型",
+                "options": ["expression", "contains", "regex", "comparison"],
+                "default": "expression"
+            },
+            "condition": {
+                "type": "text",
+                "label": "条件表达式",
+                "default": "len(str(input)) > 10",
+                "help": "expression: Python表达式，使用 input 变量; contains: 包含的文本; regex: 正则表达式; comparison: 如 '> 10'"
+            },
+            "true_value": {
+                "type": "text",
+                "label": "条件为真时的输出",
+                "default": "{input}"
+            },
+            "false_value": {
+                "type": "text",
+                "label": "条件为假时的输出",
+                "default": ""
+            }
+        }
+    },
+    NodeType.TEXT_PROCESSING: {
+        "name": "文本处理",
+        "icon": "📝",
+        "color": "#eff6ff",
+        "description": "对文本进行各种处理操作",
+        "executor": "execute_text_processing_node",
+        "inputs": ["text"],
+        "outputs": ["processed_text"],
+        "config_fields": {
+            "operation": {
+                "type": "select",
+                "label": "操作类型",
+                "options": ["extract", "replace", "split", "join", "format"],
+                "default": "extract"
+            },
+            "pattern": {
+                "type": "text",
+                "label": "模式/分隔符",
+                "default": "",
+                "help": "正则表达式或分隔符"
+            },
+            "template": {
+                "type": "textarea",
+                "label": "格式模板",
+                "default": "{text}",
+                "help": "用于format操作"
+            }
+        }
+    },
+    NodeType.DATA_TRANSFORM: {
+        "name": "数据转换",
+        "icon": "🔄",
+        "color": "#f3e8ff",
+        "description": "转换数据格式或结构",
+        "executor": "execute_data_transform_node",
+        "inputs": ["data"],
+        "outputs": ["transformed_data"],
+        "config_fields": {
+            "transform_type": {
+                "type": "select",
+                "label": "转换类型",
+                "options": ["json_to_text", "text_to_json", "extract_json", "merge"],
+                "default": "json_to_text"
+            },
+            "json_path": {
+                "type": "text",
+                "label": "JSON路径",
+                "default": "",
+                "help": "例如: data.items[0].name"
+            }
+        }
+    },
+    NodeType.LOOP: {
+        "name": "循环",
+        "icon": "🔁",
+        "color": "#ecfccb",
+        "description": "对列表中的每个元素执行子工作流，按原顺序收集结果",
+        "executor": "execute_loop_node",
+        "inputs": ["items"],
+        "outputs": ["results", "count"],
+        "config_fields": {
+            "body": {
+                "type": "json",
+                "label": "循环体（子工作流）",
+                "default": {
+                    "nodes": [
+                        {"id": "item", "type": "start", "name": "当前元素", "config": {},
+                         "connections": [{"target_node_id": "result", "source_output": "output", "target_input": "input"}]},
+                        {"id": "result", "type": "end", "name": "元素结果", "config": {}, "connections": []}
+                    ]
+                },
+                "help": "每个元素作为子工作流开始节点的输入，结束节点的输出收集到 results"
+            },
+            "concurrency": {
+                "type": "number",
+                "label": "并发数",
+                "default": 4,
+                "min": 1,
+                "max": 20
+            },
+            "break_condition": {
+                "type": "text",
+                "label": "提前结束条件",
+                "default": "",
+                "help": "Python表达式，input 为当前元素的结果；为真时不再处理后续元素，留空表示处理全部"
+            }
+        }
+    }
+}
+
+class WorkflowValidationError(Exception):
+    """工作流结构不合法（悬空连接、环路等）"""
+    pass
+
+@dataclass
+class ExecutionPlan:
+    """预编译的执行计划：节点索引、邻接表和入度，每个工作流只构建一次"""
+    nodes_by_id: Dict[str, Dict[str, Any]]
+    # node_id -> [(来源节点ID, 连接)]
+    incoming: Dict[str, List[tuple]]
+    # node_id -> 去重后的下游节点ID列表
+    outgoing: Dict[str, List[str]]
+    # node_id -> 去重后的上游节点数量
+    in_degree: Dict[str, int]
+    # 拓扑顺序
+    order: List[str] = field(default_factory=list)
+    # 条件节点ID -> 编译后的判断函数；循环节点ID -> 提前结束条件
+    conditions: Dict[str, Callable[[Any], bool]] = field(default_factory=dict)
+    # 循环节点ID -> 循环体子工作流的执行计划
+    loop_bodies: Dict[str, "ExecutionPlan"] = field(default_factory=dict)
+    # LLM节点的提示词模板、HTTP节点的URL模板
+    templates: Dict[str, CompiledTemplate] = field(default_factory=dict)
+
+# 使用模板的节点类型 -> 模板配置项及其默认值
+TEMPLATE_FIELDS = {
+    NodeType.LLM.value: ('user_prompt_template', '{input}'),
+    NodeType.HTTP_REQUEST.value: ('url_template', ''),
+}
+
+def template_values(node_type: str, inputs: Dict[str, Any], ctx: "ExecutionContext") -> Dict[str, Any]:
+    """模板可引用节点的各个输入端口，{input} 指向第一个输入端口"""
+    values = {name: ctx.port(value) for name, value in inputs.items()}
+    values.setdefault('input', values.get(NODE_CONFIGS[NodeType(node_type)]['inputs'][0]))
+    return values
+
+def compile_workflow(workflow: Dict[str, Any]) -> ExecutionPlan:
+    """构建执行计划，提前发现重复ID、悬空连接和环路"""
+    nodes_by_id = {}
+    for node in workflow.get('nodes', []):
+        if node['id'] in nodes_by_id:
+            raise WorkflowValidationError(f"节点ID重复: {node['id']}")
+        nodes_by_id[node['id']] = node
+    
+    incoming = {node_id: [] for node_id in nodes_by_id}
+    outgoing = {node_id: [] for node_id in nodes_by_id}
+    for node_id, node in nodes_by_id.items():
+        for conn in node.get('connections', []):
+            target_id = conn.get('target_node_id')
+            if target_id not in nodes_by_id:
+                raise WorkflowValidationError(f"节点 '{node.get('name', node_id)}' 连接到不存在的节点: {target_id}")
+            incoming[target_id].append((node_id, conn))
+            if target_id not in outgoing[node_id]:
+                outgoing[node_id].append(target_id)
+    
+    in_degree = {node_id: len({source_id for source_id, _ in incoming[node_id]}) for node_id in nodes_by_id}
+    
+    # Kahn算法求拓扑序，剩余节点即构成环路
+    remaining = dict(in_degree)
+    queue = [node_id for node_id, degree in remaining.items() if degree == 0]
+    order = []
+    while queue:
+        node_id = queue.pop()
+        order.append(node_id)
+        for target_id in outgoing[node_id]:
+            remaining[target_id] -= 1
+            if remaining[target_id] == 0:
+                queue.append(target_id)
+    if len(order) < len(nodes_by_id):
+        cyclic = [nodes_by_id[node_id].get('name', node_id) for node_id, degree in remaining.items() if degree > 0]
+        raise WorkflowValidationError(f"工作流存在环路，涉及节点: {', '.join(cyclic)}")
+    
+    # 条件表达式在加载时编译，错误不会拖到运行中途才暴露
+    conditions = {}
+    loop_bodies = {}
+    templates = {}
+    for node_id, node in nodes_by_id.items():
+        config = node.get('config', {})
+        if node.get('type') in TEMPLATE_FIELDS:
+            # 模板只解析一次，引用了不存在的输入端口时在加载时报错
+            field_name, default = TEMPLATE_FIELDS[node['type']]
+            variables = tuple(NODE_CONFIGS[NodeType(node['type'])]['inputs']) + ('input',)
+            try:
+                templates[node_id] = compile_template(str(config.get(field_name, default)), variables)
+            except TemplateError as e:
+                raise WorkflowValidationError(f"节点 '{node.get('name', node_id)}' 的模板无效: {e}")
+        if node.get('type') == NodeType.CONDITION.value:
+            try:
+                conditions[node_id] = compile_condition(config.get('condition_type', 'expression'),
+                                                        str(config.get('condition', 'True')))
+            except ConditionError as e:
+                raise WorkflowValidationError(f"节点 '{node.get('name', node_id)}' 的条件无效: {e}")
+        elif node.get('type') == NodeType.LOOP.value:
+            # 循环体同样在加载时编译
+            body = config.get('body') or NODE_CONFIGS[NodeType.LOOP]['config_fields']['body']['default']
+            if not any(n.get('type') == NodeType.START.value for n in body.get('nodes', [])):
+                raise WorkflowValidationError(f"节点 '{node.get('name', node_id)}' 的循环体缺少开始节点")
+            try:
+                loop_bodies[node_id] = compile_workflow(body)
+            except WorkflowValidationError as e:
+                raise WorkflowValidationError(f"节点 '{node.get('name', node_id)}' 的循环体无效: {e}")
+            break_condition = str(config.get('break_condition', '') or '').strip()
+            if break_condition:
+                try:
+                    conditions[node_id] = compile_condition('expression', break_condition)
+                except ConditionError as e:
+                    raise WorkflowValidationError(f"节点 '{node.get('name', node_id)}' 的提前结束条件无效: {e}")
+    
+    return ExecutionPlan(nodes_by_id=nodes_by_id, incoming=incoming, outgoing=outgoing, in_degree=in_degree, order=order,
+                         conditions=conditions, loop_bodies=loop_bodies, templates=templates)
+
+def to_item_list(value: Any) -> List[Any]:
+    """把循环节点的输入转换为列表：JSON数组字符串会被解析，普通文本按行拆分"""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped.startswith('['):
+            try:
+                parsed = json.loads(stripped)
+                if isinstance(parsed, list):
+                    return parsed
+            except (ValueError, RecursionError):
+                pass
+        return [line for line in stripped.splitlines() if line.strip()]
+    return [value]
+
+def node_fingerprint(node: Dict[str, Any], inputs: Dict[str, PortValue]) -> str:
+    """节点类型、配置和输入值的哈希，相同指纹的节点输出可以复用；输入只取各端口值的摘要"""
+    return make_cache_key(node.get('type'), node.get('config', {}),
+                          {name: port.digest for name, port in inputs.items()})
+
+def normalize_search_payload(data: Dict[str, Any]) -> Dict[str, Any]:
+    """搜索请求的规范形式，用作缓存键：去掉API密钥，查询词统一大小写和空白"""
+    payload = {k: v for k, v in data.items() if k != 'api_key'}
+    payload['query'] = ' '.join(str(payload.get('query', '')).split()).lower()
+    if 'include_domains' in payload:
+        payload['include_domains'] = sorted(payload['include_domains'])
+    return payload
+
+class ExecutionSink:
+    """执行事件接收器：日志、节点状态和流式token，默认全部忽略"""
+    # 为True时LLM节点使用流式请求并逐token回调 on_token
+    wants_tokens = False
+    
+    def on_log(self, entry: str):
+        pass
+    
+    def on_status(self, node_id: str, status: NodeStatus):
+        pass
+    
+    def on_token(self, node_id: str, token: str):
+        pass
+
+@dataclass
+class ExecutionContext:
+    """单次运行的全部状态，执行器本身不保存任何运行期数据，可被多个运行并发复用"""
+    # 运行输入，如 user_input
+    inputs: Dict[str, Any] = field(default_factory=dict)
+    # API密钥：openrouter_api_key、tavily_api_key
+    secrets: Dict[str, str] = field(default_factory=dict)
+    sink: ExecutionSink = field(default_factory=ExecutionSink)
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    node_outputs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    node_status: Dict[str, NodeStatus] = field(default_factory=dict)
+    execution_log: List[str] = field(default_factory=list)
+    # 本次运行的LLM缓存命中统计
+    cache_hits: int = 0
+    cache_misses: int = 0
+    # 本次运行使用的连接池，由执行器在运行开始时填充
+    http_pool: Optional[AsyncHttpPool] = None
+    # 本次运行的节点计时和资源统计
+    trace: Optional[RunTrace] = None
+    # 节点启动的后台任务（如搜索缓存刷新），运行结束前统一等待
+    background_tasks: List[asyncio.Task] = field(default_factory=list)
+    # 连接池在运行结束后仍然可用时为 True，后台任务交给调度器持有，不拖慢运行结束；
+    # 为 None 时由执行器按是否自建连接池决定，循环子运行沿用父运行的设置
+    detach_background: Optional[bool] = None
+    # 本次运行各节点的指纹（节点类型、配置和输入的哈希）
+    node_fingerprints: Dict[str, str] = field(default_factory=dict)
+    # 可复用的历史输出 {node_id: {"fingerprint", "outputs"}}，指纹一致的节点直接复用输出而不重新执行
+    reuse: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # 运行结束后需要调用 reusable_outputs 时设为 True；否则只为 reuse 中的节点和运行日志计算指纹
+    record_fingerprints: bool = False
+    # 已封装的端口值 {id(值): PortValue}，同一输出被多个节点使用时只序列化一次
+    port_values: Dict[int, PortValue] = field(default_factory=dict)
+    # 从运行日志继续执行时为 True，检查点中的节点一律复用（包括关闭缓存的LLM节点）
+    resumed: bool = False
+    
+    def log(self, message: str, level: str = "INFO"):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        log_entry = f"[{timestamp}] [{level}] {message}"
+        self.execution_log.append(log_entry)
+        self.sink.on_log(log_entry)
+    
+    def port(self, value: Any) -> PortValue:
+        """取得值的 PortValue 封装；非字符串的值在本次运行内共享同一个封装"""
+        if isinstance(value, str):
+            return PortValue(value)
+        port = self.port_values.get(id(value))
+        if port is None or port.value is not value:
+            # PortValue 持有原始对象，运行期间 id 不会被复用
+            port = PortValue(value)
+            self.port_values[id(value)] = port
+        return port
+    
+    def reusable_outputs(self) -> Dict[str, Dict[str, Any]]:
+        """本次运行成功节点的指纹和输出，可作为下次运行的 reuse（需设置 record_fingerprints）"""
+        return {
+            node_id: {"fingerprint": self.node_fingerprints[node_id], "outputs": outputs}
+            for node_id, outputs in self.node_outputs.items() if node_id in self.node_fingerprints
+        }
+    
+    def set_status(self, node_id: str, status: NodeStatus):
+        self.node_status[node_id] = status
+        self.sink.on_status(node_id, status)
+
+class _LoopItemSink(ExecutionSink):
+    """循环体单个元素运行的事件接收器：日志加上循环节点和元素序号后实时写入父运行，
+    节点状态和流式token以带序号的节点ID转发给父运行的接收器"""
+    
+    def __init__(self, parent: ExecutionContext, loop_node: Dict[str, Any], index: int):
+        self.parent = parent
+        self.log_prefix = f"[{loop_node['name']} #{index + 1}]"
+        self.id_prefix = f"{loop_node['id']}[{index + 1}]"
+        self.wants_tokens = parent.sink.wants_tokens
+    
+    def on_log(self, entry: str):
+        entry = f"{self.log_prefix} {entry}"
+        self.parent.execution_log.append(entry)
+        self.parent.sink.on_log(entry)
+    
+    def on_status(self, node_id: str, status: NodeStatus):
+        self.parent.sink.on_status(f"{self.id_prefix}.{node_id}", status)
+    
+    def on_token(self, node_id: str, token: str):
+        self.parent.sink.on_token(f"{self.id_prefix}.{node_id}", token)
+
+# 节点执行器函数
+class WorkflowExecutor:
+    def __init__(self, workflow: Dict[str, Any], max_concurrency: Optional[int] = None,
+                 http_pool: Optional[AsyncHttpPool] = None, llm_cache: Optional[ResponseCache] = None,
+                 dispatcher: Optional[ProviderDispatcher] = None, code_sandbox: Optional[CodeSandbox] = None,
+                 search_cache: Optional[ResponseCache] = None, journal: Optional[RunJournal] = None,
+                 plan: Optional[ExecutionPlan] = None):
+        self.workflow = workflow
+        # 所有网络节点共享的连接池；未传入时每次执行期间自行创建并关闭
+        self.http_pool = http_pool
+        # OpenRouter/Tavily 调用的重试、限流和熔断状态，应在进程内共享
+        self.dispatcher = dispatcher or ProviderDispatcher()
+        # LLM响应缓存（可选）
+        self.llm_cache = llm_cache
+        # 网络搜索结果缓存（可选），过期条目先返回再后台刷新
+        self.search_cache = search_cache
+        # LLM微批处理（batch_mode 不为 off 的节点使用），首次使用时创建
+        self._llm_batcher: Optional[LLMBatcher] = None
+        # 代码节点的工作进程池，未传入时使用进程内共享的默认沙箱
+        self.code_sandbox = code_sandbox or default_sandbox()
+        # 运行日志（可选），记录每个节点完成时的状态和输出，失败的运行可用 resume 继续
+        self.journal = journal
+        # 同一工作流内可同时运行的节点数，优先使用参数，其次使用工作流配置
+        self.max_concurrency = max(1, int(max_concurrency or workflow.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)))
+        # 已编译的执行计划（如 workflow_loader 的缓存），未传入时首次使用时编译
+        self._plan: Optional[ExecutionPlan] = plan
+    
+    @property
+    def plan(self) -> ExecutionPlan:
+        """首次使用时编译执行计划"""
+        if self._plan is None:
+            self._plan = compile_workflow(self.workflow)
+        return self._plan
+    
+    async def execute_start_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"开始节点 '{node['name']}' 执行")
+        config = node.get('config', {})
+        
+        # 获取用户输入
+        if 'user_input' in inputs:
+            output = inputs['user_input']
+        else:
+            output = ctx.inputs.get('user_input', '')
+        
+        ctx.log(f"输入内容: {preview(output)}")
+        return {"output": output}
+    
+    async def execute_end_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"结束节点 '{node['name']}' 执行")
+        input_value = inputs.get('input', '')
+        config = node.get('config', {})
+        
+        # 格式化输出
+        output_format = config.get('output_format', 'text')
+        if output_format == 'json' and isinstance(input_value, str):
+            try:
+                input_value = json.loads(input_value)
+            except:
+                pass
+        
+        ctx.log(f"最终输出: {preview(input_value)}")
+        return {"output": input_value}
+    
+    async def execute_llm_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"LLM节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        
+        # 构建提示词（用户提示词使用预编译的模板）
+        system_prompt = config.get('system_prompt', '你是一个有帮助的AI助手。')
+        user_prompt = self.plan.templates[node['id']].render(template_values(node['type'], inputs, ctx))
+        
+        # 调用API
+        try:
+            headers = {
+                "Authorization": f"Bearer {ctx.secrets.get('openrouter_api_key', '')}",
+                "Content-Type": "application/json"
+            }
+            
+            model = config.get('model', 'gpt-3.5-turbo')
+            # 映射模型名称到OpenRouter格式
+            model_mapping = {
+                'gpt-3.5-turbo': 'openai/gpt-3.5-turbo',
+                'gpt-4': 'openai/gpt-4',
+                'claude-3': 'anthropic/claude-3-sonnet',
+                'deepseek-chat': 'deepseek/deepseek-chat'
+            }
+            model = model_mapping.get(model, model)
+            temperature = config.get('temperature', 0.7)
+            max_tokens = config.get('max_tokens', 1000)
+            
+            # 查询响应缓存
+            cache_key = None
+            if self.llm_cache is not None and config.get('cache_mode', 'enabled') != 'disabled':
+                cache_key = make_cache_key(model, system_prompt, user_prompt, temperature, max_tokens)
+                cached = self.llm_cache.get(cache_key)
+                if cached is not None:
+                    ctx.cache_hits += 1
+                    tracing.record_cache_hit()
+                    ctx.log(f"LLM缓存命中 (本次执行 命中: {ctx.cache_hits}, 未命中: {ctx.cache_misses})")
+                    if ctx.sink.wants_tokens:
+                        ctx.sink.on_token(node['id'], cached.get('text', ''))
+                    return cached
+                ctx.cache_misses += 1
+                ctx.log(f"LLM缓存未命中 (本次执行 命中: {ctx.cache_hits}, 未命中: {ctx.cache_misses})")
+            
+            data = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            }
+            
+            ctx.log(f"调用模型: {model}")
+            batch_mode = config.get('batch_mode', 'off')
+            if ctx.sink.wants_tokens and config.get('stream', 'enabled') != 'disabled':
+                text, tokens = await self._stream_chat_completion(node, headers, data, ctx)
+                ctx.log(f"LLM流式响应完成，使用tokens: {tokens}")
+            elif batch_mode in ('concurrent', 'packed'):
+                # 与同一时间窗口内配置相同的调用合并发送
+                text, tokens = await self.llm_batcher.submit(batch_mode, data, ctx, ctx.secrets.get('openrouter_api_key', ''))
+                ctx.log(f"LLM响应成功，使用tokens: {tokens}")
+            else:
+                text, tokens = await self._chat_completion(data, ctx)
+                ctx.log(f"LLM响应成功，使用tokens: {tokens}")
+            
+            tracing.record_tokens(tokens)
+            outputs = {"text": text, "tokens_used": tokens}
+            if cache_key is not None:
+                self.llm_cache.set(cache_key, outputs)
+            return outputs
+                
+        except Exception as e:
+            ctx.log(f"LLM节点执行失败: {str(e)}", "ERROR")
+            raise e
+    
+    @property
+    def llm_batcher(self) -> LLMBatcher:
+        if self._llm_batcher is None:
+            self._llm_batcher = LLMBatcher(self._chat_completion)
+        return self._llm_batcher
+    
+    async def _chat_completion(self, data: Dict[str, Any], ctx: ExecutionContext) -> tuple:
+        """非流式调用OpenRouter，返回 (文本, tokens)"""
+        headers = {
+            "Authorization": f"Bearer {ctx.secrets.get('openrouter_api_key', '')}",
+            "Content-Type": "application/json"
+        }
+        response = await self.dispatcher.request(
+            ctx.http_pool,
+            "openrouter",
+            ctx.secrets.get('openrouter_api_key', ''),
+            "POST",
+            "https://openrouter.ai/api/v1/chat/completions",
+            log=ctx.log,
+            headers=headers,
+            json=data,
+            timeout=60
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            text = result['choices'][0]['message']['content']
+            tokens = result.get('usage', {}).get('total_tokens', 0)
+            return text, tokens
+        else:
+            raise Exception(f"API调用失败: {response.status_code} - {response.text}")
+    
+    async def _stream_chat_completion(self, node: Dict[str, Any], headers: Dict[str, str],
+                                      data: Dict[str, Any], ctx: ExecutionContext) -> tuple:
+        """以SSE方式调用OpenRouter，逐token回调并返回 (完整文本, tokens)"""
+        data = dict(data, stream=True, usage={"include": True})
+        chunks = []
+        tokens = 0
+        async with self.dispatcher.stream(
+            ctx.http_pool,
+            "openrouter",
+            ctx.secrets.get('openrouter_api_key', ''),
+            "POST",
+            "https://openrouter.ai/api/v1/chat/completions",
+            log=ctx.log,
+            headers=headers,
+            json=data,
+            timeout=60
+        ) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode('utf-8', errors='replace')
+                raise Exception(f"API调用失败: {response.status_code} - {body}")
+            
+            async for line in response.aiter_lines():
+                # SSE: 跳过空行和注释行（如 ": OPENROUTER PROCESSING"）
+                if not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                event = json.loads(payload)
+                if 'error' in event:
+                    raise Exception(f"API流式响应错误: {event['error']}")
+                if event.get('usage'):
+                    tokens = event['usage'].get('total_tokens', tokens)
+                for choice in event.get('choices', []):
+                    token = (choice.get('delta') or {}).get('content')
+                    if token:
+                        chunks.append(token)
+                        ctx.sink.on_token(node['id'], token)
+        return ''.join(chunks), tokens
+    
+    async def execute_web_search_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"网络搜索节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        query = ctx.port(inputs.get('query', '')).text
+        
+        num_results = config.get('num_results', 5)
+        search_type = config.get('search_type', 'general')
+        
+        ctx.log(f"搜索查询: {preview(query)}")
+        ctx.log(f"搜索类型: {search_type}, 结果数: {num_results}")
+        
+        # 使用TAVILY API进行搜索
+        try:
+            # 检查TAVILY API密钥
+            tavily_key = ctx.secrets.get('tavily_api_key', '')
+            if not tavily_key:
+                raise Exception("未配置TAVILY API密钥，请在侧边栏配置")
+            
+            data = {
+                "api_key": tavily_key,
+                "query": query,
+                "max_results": num_results,
+                "search_depth": config.get('search_depth', 'basic'),
+                "include_answer": True,
+                "include_raw_content": False,
+                "include_images": False
+            }
+            
+            # 根据搜索类型添加额外参数
+            if search_type == "news":
+                data["topic"] = "news"
+                data["days"] = config.get('days', 7)
+            elif search_type == "academic":
+                data["include_domains"] = ["arxiv.org", "scholar.google.com", "pubmed.ncbi.nlm.nih.gov", "ieee.org"]
+            
+            # 添加时间范围
+            if config.get('days'):
+                data["days"] = config.get('days', 30)
+            
+            # 缓存键：规范化后的请求参数（不含API密钥）
+            cache_key = make_cache_key("tavily_search", normalize_search_payload(data))
+            if self.search_cache is not None:
+                entry = self.search_cache.get_entry(cache_key)
+                if entry is not None:
+                    cached, fresh = entry
+                    tracing.record_cache_hit()
+                    if fresh:
+                        ctx.log(f"命中搜索缓存，找到 {len(cached['results'])} 个结果")
+                    else:
+                        # 先返回旧结果，后台刷新缓存
+                        ctx.log(f"使用过期的搜索缓存（{len(cached['results'])} 个结果），后台刷新中")
+                        self._refresh_search_cache(cache_key, data, search_type, ctx)
+                    return cached
+            
+            output = await self._tavily_search(data, ctx)
+            if self.search_cache is not None:
+                self._store_search_result(cache_key, output, search_type)
+            ctx.log(f"搜索完成，找到 {len(output['results'])} 个结果")
+            return output
+                
+        except Exception as e:
+            ctx.log(f"搜索失败: {str(e)}", "ERROR")
+            # 返回错误信息而不是模拟结果
+            raise e
+    
+    async def _tavily_search(self, data: Dict[str, Any], ctx: ExecutionContext,
+                             pool: Optional[AsyncHttpPool] = None) -> Dict[str, Any]:
+        """调用TAVILY搜索接口，返回 {"results": [...], "urls": [...]}；pool 默认为本次运行的连接池"""
+        headers = {
+            "Content-Type": "application/json"
+        }
+        
+        response = await self.dispatcher.request(
+            pool or ctx.http_pool,
+            "tavily",
+            data["api_key"],
+            "POST",
+            "https://api.tavily.com/search",
+            log=ctx.log,
+            headers=headers,
+            json=data,
+            timeout=30
+        )
+        
+        if response.status_code == 200:
+            result_data = response.json()
+            
+            # 处理TAVILY返回的结果
+            results = []
+            urls = []
+            
+            # 如果有答案，添加到结果中
+            if result_data.get('answer'):
+                results.append({
+                    'title': 'AI Generated Answer',
+                    'snippet': result_data['answer'],
+                    'url': ''
+                })
+            
+            # 处理搜索结果
+            for item in result_data.get('results', [])[:data["max_results"]]:
+                results.append({
+                    'title': item.get('title', ''),
+                    'snippet': item.get('content', ''),
+                    'url': item.get('url', ''),
+                    'score': item.get('score', 0)
+                })
+                urls.append(item.get('url', ''))
+            
+            return {"results": results, "urls": urls}
+        else:
+            error_msg = f"TAVILY API调用失败: {response.status_code}"
+            if response.text:
+                error_msg += f" - {response.text}"
+            raise Exception(error_msg)
+    
+    def _store_search_result(self, cache_key: str, output: Dict[str, Any], search_type: str):
+        ttl, stale_ttl = SEARCH_CACHE_TTL.get(search_type, SEARCH_CACHE_TTL['general'])
+        self.search_cache.set(cache_key, output, ttl=ttl, stale_ttl=stale_ttl)
+    
+    def _refresh_search_cache(self, cache_key: str, data: Dict[str, Any], search_type: str, ctx: ExecutionContext):
+        """后台重新搜索并更新缓存，同一查询在共享缓存上同时只刷新一次"""
+        if not self.search_cache.begin_refresh(cache_key):
+            return
+        # 运行结束时 ctx.http_pool 会被清空，刷新使用发起时的连接池
+        pool = ctx.http_pool
+        
+        async def refresh():
+            try:
+                self._store_search_result(cache_key, await self._tavily_search(data, ctx, pool), search_type)
+            except Exception as e:
+                ctx.log(f"后台刷新搜索缓存失败: {str(e)}", "WARNING")
+            finally:
+                self.search_cache.end_refresh(cache_key)
+        
+        task = asyncio.ensure_future(refresh())
+        if ctx.detach_background:
+            self.dispatcher.detach(task)
+        else:
+            # 连接池随本次运行关闭，运行结束前等待刷新完成
+            ctx.background_tasks.append(task)
+    
+    async def execute_knowledge_retrieval_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"知识检索节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        
+        query = ctx.port(inputs.get('query', '')).text
+        index_name = config.get('index_name', 'default')
+        top_k = int(config.get('top_k', 5))
+        
+        try:
+            index = open_index(index_path(KNOWLEDGE_DIR, index_name))
+            if index is None:
+                raise Exception(f"知识库 '{index_name}' 不存在，请先上传文档建立索引")
+            results = index.search(query, top_k=top_k, mode=config.get('search_mode', 'bm25'))
+            ctx.log(f"检索完成，找到 {len(results)} 个相关片段")
+            context = "\n\n".join(f"[{r['source']}] {r['text']}" for r in results)
+            return {"results": results, "context": context}
+        except Exception as e:
+            ctx.log(f"知识检索失败: {str(e)}", "ERROR")
+            raise e
+    
+    async def execute_http_request_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"HTTP请求节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        
+        # 构建URL
+        url = self.plan.templates[node['id']].render(template_values(node['type'], inputs, ctx))
+        
+        method = config.get('method', 'GET')
+        headers = config.get('headers', {})
+        timeout = config.get('timeout', 30)
+        
+        ctx.log(f"发送 {method} 请求到: {url}")
+        
+        try:
+            response = await ctx.http_pool.request(
+                method,
+                url,
+                headers=headers,
+                timeout=timeout,
+                params=inputs.get('params') or {}
+            )
+            
+            ctx.log(f"响应状态码: {response.status_code}")
+            
+            # 尝试解析JSON
+            try:
+                response_data = response.json()
+            except:
+                response_data = response.text
+            
+            return {
+                "response": response_data,
+                "status_code": response.status_code
+            }
+        except Exception as e:
+            ctx.log(f"HTTP请求失败: {str(e)}", "ERROR")
+            raise e
+    
+    async def execute_code_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"代码执行节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        code = config.get('code', '')
+        
+        timeout = float(config.get('timeout', 10) or 10)
+        memory_limit_mb = config.get('memory_limit_mb', DEFAULT_MEMORY_LIMIT_MB)
+        
+        try:
+            # 在沙箱工作进程中执行，不阻塞事件循环
+            output = await self.code_sandbox.run(code, inputs.get('input', ''), timeout=timeout,
+                                                 memory_limit_mb=int(memory_limit_mb) if memory_limit_mb else None)
+            ctx.log(f"代码执行成功")
+            return {"output": output}
+        except Exception as e:
+            ctx.log(f"代码执行失败: {str(e)}", "ERROR")
+            raise e
+    
+    async def execute_condition_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"条件判断节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        
+        input_value = inputs.get('input', '')
+        condition = config.get('condition', 'True')
+        
+        try:
+            # 使用执行计划中预编译的判断函数
+            result = self.plan.conditions[node['id']](input_value)
+            ctx.log(f"条件 '{condition}' 评估结果: {result}")
+            
+            if result:
+                output = config.get('true_value', '{input}').replace('{input}', ctx.port(input_value).text)
+                return {"true_output": output, "false_output": None}
+            else:
+                output = config.get('false_value', '').replace('{input}', ctx.port(input_value).text)
+                return {"true_output": None, "false_output": output}
+        except Exception as e:
+            ctx.log(f"条件评估失败: {str(e)}", "ERROR")
+            raise e
+    
+    async def execute_text_processing_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"文本处理节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        
+        port = ctx.port(inputs.get('text', ''))
+        text = port.text
+        operation = config.get('operation', 'extract')
+        pattern = config.get('pattern', '')
+        
+        try:
+            if operation == 'extract':
+                matches = re.findall(pattern, text) if pattern else [text]
+                result = '\n'.join(matches)
+            elif operation == 'replace':
+                parts = pattern.split('|')
+                if len(parts) == 2:
+                    result = text.replace(parts[0], parts[1])
+                else:
+                    result = text
+            elif operation == 'split':
+                result = text.split(pattern or ' ')
+            elif operation == 'join':
+                if port.kind == 'list':
+                    result = (pattern or ' ').join(ctx.port(item).text for item in port.value)
+                else:
+                    result = text
+            elif operation == 'format':
+                template = config.get('template', '{text}')
+                result = template.replace('{text}', text)
+            else:
+                result = text
+            
+            ctx.log(f"文本处理完成: {operation}")
+            return {"processed_text": result}
+        except Exception as e:
+            ctx.log(f"文本处理失败: {str(e)}", "ERROR")
+            raise e
+    
+    async def execute_data_transform_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"数据转换节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        
+        data = inputs.get('data', '')
+        transform_type = config.get('transform_type', 'json_to_text')
+        
+        try:
+            if transform_type == 'json_to_text':
+                result = ctx.port(data).pretty_text
+            elif transform_type == 'text_to_json':
+                if isinstance(data, str):
+                    result = json.loads(data)
+                else:
+                    result = data
+            elif transform_type == 'extract_json':
+                # 从文本中提取第一个JSON对象或数组
+                if isinstance(data, str):
+                    result = extract_json(data)
+                    if result is None:
+                        result = {}
+                else:
+                    result = data
+            else:
+                result = data
+            
+            ctx.log(f"数据转换完成: {transform_type}")
+            return {"transformed_data": result}
+        except Exception as e:
+            ctx.log(f"数据转换失败: {str(e)}", "ERROR")
+            raise e
+    
+    async def execute_loop_node(self, node: Dict[str, Any], inputs: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        ctx.log(f"循环节点 '{node['name']}' 开始执行")
+        config = node.get('config', {})
+        items = to_item_list(inputs.get('items'))
+        concurrency = max(1, int(config.get('concurrency', 4) or 1))
+        break_condition = self.plan.conditions.get(node['id'])
+        ctx.log(f"共 {len(items)} 个元素，并发数: {concurrency}")
+        
+        # 子工作流复用当前运行的连接池、缓存、限流、代码沙箱和已编译的执行计划
+        body_workflow = config.get('body') or NODE_CONFIGS[NodeType.LOOP]['config_fields']['body']['default']
+        body = WorkflowExecutor(body_workflow, max_concurrency=self.max_concurrency, http_pool=ctx.http_pool,
+                                llm_cache=self.llm_cache, dispatcher=self.dispatcher, code_sandbox=self.code_sandbox,
+                                search_cache=self.search_cache, plan=self.plan.loop_bodies[node['id']])
+        
+        results: List[Any] = [None] * len(items)
+        # 触发提前结束的最小元素下标，之后的元素不再执行
+        stop_index = len(items)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run_item(index: int, item: Any):
+            nonlocal stop_index
+            async with semaphore:
+                if index > stop_index:
+                    return
+                # 元素运行的日志实时并入父运行，失败时可以看到循环体内部出错的节点
+                item_ctx = ExecutionContext(inputs={'user_input': item}, secrets=ctx.secrets, run_id=f"{ctx.run_id}:{index}",
+                                            sink=_LoopItemSink(ctx, node, index),
+                                            detach_background=ctx.detach_background)
+                try:
+                    results[index] = await body.execute(context=item_ctx)
+                except Exception as e:
+                    raise Exception(f"第 {index + 1} 个元素执行失败: {str(e)}") from e
+                finally:
+                    ctx.cache_hits += item_ctx.cache_hits
+                    ctx.cache_misses += item_ctx.cache_misses
+                    if item_ctx.trace is not None:
+                        tracing.record_child_run(item_ctx.trace.summary())
+                if break_condition is not None and index < stop_index and break_condition(results[index]):
+                    stop_index = index
+                    ctx.log(f"第 {index + 1} 个元素满足提前结束条件，停止处理后续元素")
+                    for later_index, task in enumerate(tasks):
+                        if later_index > index:
+                            task.cancel()
+        
+        tasks = [asyncio.ensure_future(run_item(index, item)) for index, item in enumerate(items)]
+        task_index = {task: index for index, task in enumerate(tasks)}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    # 提前结束之后的元素被取消或出错都不影响结果
+                    if task_index[task] > stop_index or task.cancelled():
+                        continue
+                    if task.exception() is not None:
+                        raise task.exception()
+        except Exception as e:
+            ctx.log(f"循环执行失败: {str(e)}", "ERROR")
+            raise e
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        results = results[:stop_index + 1]
+        ctx.log(f"循环完成，收集 {len(results)} 个结果")
+        return {"results": results, "count": len(results)}
+    
+    def is_edge_live(self, source_id: str, conn: Dict[str, Any], ctx: ExecutionContext) -> bool:
+        """连接是否有效：上游已执行，且不是分支节点未选中的端口"""
+        outputs = ctx.node_outputs.get(source_id)
+        if outputs is None:
+            return False
+        source_type = NodeType(self.plan.nodes_by_id[source_id]['type'])
+        if NODE_CONFIGS.get(source_type, {}).get('branching'):
+            return outputs.get(conn.get('source_output', 'output')) is not None
+        return True
+    
+    async def execute_node(self, node: Dict[str, Any], ctx: ExecutionContext) -> Dict[str, Any]:
+        """执行单个节点"""
+        node_type = NodeType(node['type'])
+        node_config = NODE_CONFIGS.get(node_type, {})
+        
+        # 收集输入
+        inputs = {}
+        input_names = node_config.get('inputs', [])
+        for source_id, conn in self.plan.incoming[node['id']]:
+            input_name = conn.get('target_input')
+            if input_name in input_names and self.is_edge_live(source_id, conn, ctx):
+                inputs[input_name] = ctx.node_outputs[source_id].get(conn.get('source_output', 'output'))
+        
+        # 配置和输入都没有变化的节点复用上次的输出（开始节点的输入即运行输入）
+        # 指纹只在需要时计算：有可复用的历史输出、记录运行日志或调用方要求保留指纹
+        previous = ctx.reuse.get(node['id'])
+        fingerprint = None
+        if previous is not None or self.journal is not None or ctx.record_fingerprints:
+            # 输入按端口值的摘要参与哈希，多个下游共用的大对象只序列化和哈希一次
+            fingerprint_inputs = {'user_input': ctx.inputs.get('user_input', '')} if node_type == NodeType.START else inputs
+            fingerprint = node_fingerprint(node, {name: ctx.port(value) for name, value in fingerprint_inputs.items()})
+            ctx.node_fingerprints[node['id']] = fingerprint
+        reusable = ctx.resumed or not (node_type == NodeType.LLM and node.get('config', {}).get('cache_mode') == 'disabled')
+        if reusable and previous is not None and previous.get('fingerprint') == fingerprint:
+            ctx.log(f"节点 '{node['name']}' 的配置和输入未变化，复用上次输出")
+            tracing.record_cache_hit()
+            ctx.node_outputs[node['id']] = previous['outputs']
+            return previous['outputs']
+        
+        # 执行节点
+        executor_name = node_config.get('executor', '')
+        if hasattr(self, executor_name):
+            executor = getattr(self, executor_name)
+            outputs = await executor(node, inputs, ctx)
+            ctx.node_outputs[node['id']] = outputs
+            return outputs
+        else:
+            ctx.log(f"未找到节点类型 {node_type.value} 的执行器", "ERROR")
+            raise Exception(f"未实现的节点类型: {node_type.value}")
+    
+    async def execute(self, user_input: str = "", context: Optional[ExecutionContext] = None) -> Any:
+        """执行整个工作流，依赖已满足的节点并发执行；运行状态全部写入 context"""
+        ctx = context if context is not None else ExecutionContext()
+        ctx.trace = RunTrace(run_id=ctx.run_id, workflow_name=self.workflow.get('name', ''))
+        ctx.log("开始执行工作流", "INFO")
+        ctx.node_outputs.clear()
+        ctx.node_fingerprints.clear()
+        ctx.port_values.clear()
+        
+        # 设置初始输入
+        if user_input:
+            ctx.inputs['user_input'] = user_input
+            
+        # 初始化所有节点状态
+        for node in self.workflow['nodes']:
+            ctx.set_status(node['id'], NodeStatus.PENDING)
+        
+        # 找到开始节点
+        start_nodes = [n for n in self.workflow['nodes'] if n['type'] == 'start']
+        if not start_nodes:
+            ctx.log("未找到开始节点", "ERROR")
+            raise Exception("工作流必须包含开始节点")
+        
+        # 编译执行计划（结构错误在调用任何节点前暴露）
+        try:
+            plan = self.plan
+        except WorkflowValidationError as e:
+            ctx.log(f"工作流结构校验失败: {str(e)}", "ERROR")
+            raise e
+        nodes_by_id = plan.nodes_by_id
+        if self.journal is not None:
+            self.journal.start_run(ctx.run_id, self.workflow, ctx.inputs)
+        # 每个节点尚未完成的上游节点数
+        remaining = dict(plan.in_degree)
+        
+        owns_http_pool = self.http_pool is None
+        ctx.http_pool = self.http_pool or AsyncHttpPool()
+        if owns_http_pool:
+            ctx.detach_background = False
+        elif ctx.detach_background is None:
+            ctx.detach_background = True
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        ctx.log(f"最大并发节点数: {self.max_concurrency}")
+        
+        async def run_node(node: Dict[str, Any]) -> Dict[str, Any]:
+            # 每个节点运行在独立任务中，current_span 只对本节点可见
+            span = ctx.trace.start_span(node)
+            tracing.current_span.set(span)
+            async with semaphore:
+                ctx.set_status(node['id'], NodeStatus.RUNNING)
+                span.started_at = time.time()
+                span.status = NodeStatus.RUNNING.value
+                try:
+                    outputs = await self.execute_node(node, ctx)
+                except BaseException as e:
+                    span.status = NodeStatus.FAILED.value
+                    span.error = str(e) or type(e).__name__
+                    raise
+                finally:
+                    span.ended_at = time.time()
+                span.status = NodeStatus.SUCCESS.value
+                return outputs
+        
+        # 就绪队列调度：依赖全部完成的节点立即作为任务启动
+        running: Dict[asyncio.Task, str] = {}
+        
+        def launch(node_id: str):
+            running[asyncio.ensure_future(run_node(nodes_by_id[node_id]))] = node_id
+        
+        def release_targets(node_id: str):
+            """上游完成或被跳过后更新下游入度；没有任何有效输入的节点跳过，并继续向下传递"""
+            pending = [node_id]
+            while pending:
+                current_id = pending.pop()
+                for target_id in plan.outgoing[current_id]:
+                    remaining[target_id] -= 1
+                    if remaining[target_id] > 0:
+                        continue
+                    if any(self.is_edge_live(source_id, conn, ctx) for source_id, conn in plan.incoming[target_id]):
+                        launch(target_id)
+                    else:
+                        target = nodes_by_id[target_id]
+                        ctx.trace.start_span(target).status = NodeStatus.SKIPPED.value
+                        ctx.set_status(target_id, NodeStatus.SKIPPED)
+                        ctx.log(f"节点 '{target['name']}' 所在分支未被选中，跳过执行")
+                        pending.append(target_id)
+        
+        launch(start_nodes[0]['id'])
+        
+        run_status = NodeStatus.FAILED
+        run_error = None
+        try:
+            while running:
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = running.pop(task)
+                    node = nodes_by_id[node_id]
+                    try:
+                        task.result()
+                    except Exception as e:
+                        ctx.set_status(node_id, NodeStatus.FAILED)
+                        ctx.log(f"节点 '{node['name']}' 执行失败: {str(e)}", "ERROR")
+                        run_error = f"节点 '{node['name']}' 执行失败: {str(e)}"
+                        if self.journal is not None:
+                            self.journal.record_node(ctx.run_id, node_id, NodeStatus.FAILED.value,
+                                                     ctx.node_fingerprints.get(node_id), error=str(e))
+                        raise e
+                    
+                    ctx.set_status(node_id, NodeStatus.SUCCESS)
+                    if self.journal is not None:
+                        self.journal.record_node(ctx.run_id, node_id, NodeStatus.SUCCESS.value,
+                                                 ctx.node_fingerprints.get(node_id), ctx.node_outputs.get(node_id))
+                    
+                    # 启动依赖已满足的下游节点
+                    release_targets(node_id)
+            run_status = NodeStatus.SUCCESS
+        finally:
+            # 出错时取消仍在运行的分支
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running.keys(), return_exceptions=True)
+            if ctx.background_tasks:
+                # 后台刷新使用本次运行的连接池，关闭连接池前等待完成
+                await asyncio.gather(*ctx.background_tasks, return_exceptions=True)
+                ctx.background_tasks.clear()
+            if owns_http_pool:
+                await ctx.http_pool.aclose()
+            ctx.http_pool = None
+            if self.journal is not None:
+                self.journal.finish_run(ctx.run_id, run_status.value, run_error)
+            
+            # 无论成功与否都记录运行统计，失败的运行同样可以导出trace
+            ctx.trace.finish()
+            summary = ctx.trace.summary()
+            ctx.log(f"运行统计: 耗时 {summary['wall_time']:.2f}s, tokens {summary['tokens']}, "
+                    f"发送 {summary['bytes_out']} 字节, 接收 {summary['bytes_in']} 字节, "
+                    f"缓存命中 {summary['cache_hits']} 次, 重试 {summary['retries']} 次, "
+                    f"最慢节点 '{summary['slowest_node']}' ({summary['slowest_node_time']:.2f}s)")
+        
+        if self.llm_cache is not None and (ctx.cache_hits or ctx.cache_misses):
+            ctx.log(f"LLM缓存统计: 命中 {ctx.cache_hits} 次, 未命中 {ctx.cache_misses} 次")
+        
+        # 获取结束节点的输出（分支工作流取实际执行到的结束节点）
+        end_nodes = [n for n in self.workflow['nodes'] if n['type'] == 'end' and n['id'] in ctx.node_outputs]
+        if end_nodes:
+            final_output = ctx.node_outputs[end_nodes[0]['id']].get('output')
+            ctx.log(f"工作流执行完成", "INFO")
+            return final_output
+        else:
+            ctx.log("未找到有效的输出", "WARNING")
+            return None
+    
+    async def resume(self, run_id: str, context: Optional[ExecutionContext] = None) -> Any:
+        """从运行日志继续执行失败的运行：沿用原运行的ID和输入，已成功的节点直接复用检查点中的输出"""
+        if self.journal is None:
+            raise Exception("继续执行需要配置运行日志")
+        run = self.journal.get_run(run_id)
+        if run is None:
+            raise Exception(f"未找到运行记录: {run_id}")
+        ctx = context if context is not None else ExecutionContext()
+        ctx.run_id = run_id
+        ctx.inputs = dict(run['inputs'])
+        ctx.reuse = self.journal.completed_nodes(run_id)
+        ctx.resumed = True
+        ctx.log(f"从运行 {run_id[:8]} 的检查点继续执行，可复用 {len(ctx.reuse)} 个已完成节点")
+        return await self.execute(context=ctx)
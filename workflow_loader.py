@@ -0,0 +1,188 @@
+import copy
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from response_cache import make_cache_key
+from workflow_engine import NODE_CONFIGS, ExecutionPlan, NodeType, WorkflowValidationError, compile_workflow
+
+# 缓存的已加载工作流数量
+DEFAULT_LOADED_CACHE_SIZE = 128
+
+_NODE_TYPES = {node_type.value: node_type for node_type in NodeType}
+
+class WorkflowSchemaError(WorkflowValidationError):
+    """工作流文档不符合结构要求，errors 为一次校验发现的全部问题"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("\n".join(errors))
+
+@dataclass
+class LoadedWorkflow:
+    """校验并补全默认值后的工作流及其执行计划，按内容哈希缓存共享，不应修改"""
+    key: str
+    workflow: Dict[str, Any]
+    plan: ExecutionPlan
+
+def _normalize_field(where: str, field_name: str, field_def: Dict[str, Any], value: Any, errors: List[str]) -> Any:
+    """校验单个配置项，返回规范化后的值"""
+    field_type = field_def.get('type')
+    if field_type in ('number', 'slider'):
+        number = value
+        if isinstance(value, str):
+            try:
+                number = float(value) if any(c in value for c in '.eE') else int(value)
+            except ValueError:
+                number = None
+        if isinstance(number, bool) or not isinstance(number, (int, float)):
+            errors.append(f"{where} 的配置 {field_name} 应为数字: {value!r}")
+            return value
+        if 'min' in field_def and number < field_def['min'] or 'max' in field_def and number > field_def['max']:
+            errors.append(f"{where} 的配置 {field_name} 超出范围 [{field_def.get('min')}, {field_def.get('max')}]: {number}")
+        return number
+    if field_type == 'select':
+        if value not in field_def.get('options', []) and not field_def.get('allow_custom'):
+            errors.append(f"{where} 的配置 {field_name} 取值无效: {value!r}，可选值: {', '.join(map(str, field_def.get('options', [])))}")
+        return value
+    if field_type == 'json':
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except (ValueError, RecursionError):
+                errors.append(f"{where} 的配置 {field_name} 不是合法的JSON")
+                return value
+        if not isinstance(value, dict):
+            errors.append(f"{where} 的配置 {field_name} 应为JSON对象")
+        return value
+    # text / textarea / code
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if not isinstance(value, str):
+        errors.append(f"{where} 的配置 {field_name} 应为文本")
+    return value
+
+def _normalize_workflow(workflow: Any, errors: List[str], prefix: str = "") -> Dict[str, Any]:
+    """一次遍历校验整个文档并补全默认值，问题追加到 errors，返回规范化后的副本"""
+    if not isinstance(workflow, dict):
+        errors.append(f"{prefix}工作流必须是JSON对象")
+        return {}
+    nodes = workflow.get('nodes')
+    if not isinstance(nodes, list) or not nodes:
+        errors.append(f"{prefix}工作流缺少节点列表 nodes")
+        return {}
+
+    normalized = {key: copy.deepcopy(value) for key, value in workflow.items() if key != 'nodes'}
+    if not prefix:
+        normalized.setdefault('name', '未命名工作流')
+        normalized.setdefault('description', '')
+    normalized_nodes = []
+    node_types: Dict[str, Optional[NodeType]] = {}
+    for index, node in enumerate(nodes):
+        if not isinstance(node, dict):
+            errors.append(f"{prefix}第 {index + 1} 个节点必须是JSON对象")
+            continue
+        node_id = node.get('id')
+        if not isinstance(node_id, str) or not node_id:
+            errors.append(f"{prefix}第 {index + 1} 个节点缺少 id")
+            continue
+        if node_id in node_types:
+            errors.append(f"{prefix}节点ID重复: {node_id}")
+            continue
+        where = f"{prefix}节点 '{node.get('name') or node_id}'"
+        node_type = _NODE_TYPES.get(node.get('type'))
+        if node_type is None:
+            errors.append(f"{where} 的类型未知: {node.get('type')!r}")
+        node_types[node_id] = node_type
+
+        normalized_node = copy.deepcopy(node)
+        normalized_node.setdefault('name', node_id)
+        normalized_node.setdefault('description', '')
+        normalized_node.setdefault('position', {"x": 100 + index * 200, "y": 100})
+
+        config = normalized_node.get('config')
+        if config is None:
+            config = {}
+        elif not isinstance(config, dict):
+            errors.append(f"{where} 的 config 应为JSON对象")
+            config = {}
+        if node_type is not None:
+            # 缺少的配置项使用 config_fields 中的默认值，与编辑器显示的值一致
+            for field_name, field_def in NODE_CONFIGS[node_type].get('config_fields', {}).items():
+                if field_name not in config:
+                    config[field_name] = copy.deepcopy(field_def.get('default'))
+                config[field_name] = _normalize_field(where, field_name, field_def, config[field_name], errors)
+            if node_type == NodeType.LOOP and isinstance(config.get('body'), dict):
+                config['body'] = _normalize_workflow(config['body'], errors, prefix=f"{where} 的循环体中")
+        normalized_node['config'] = config
+
+        connections = normalized_node.get('connections')
+        if connections is None:
+            connections = []
+        elif not isinstance(connections, list) or not all(isinstance(conn, dict) for conn in connections):
+            errors.append(f"{where} 的 connections 应为连接对象列表")
+            connections = []
+        normalized_node['connections'] = connections
+        normalized_nodes.append(normalized_node)
+
+    # 所有节点类型确定后再检查连接的目标和端口
+    for node in normalized_nodes:
+        where = f"{prefix}节点 '{node['name']}'"
+        source_type = node_types[node['id']]
+        for conn in node['connections']:
+            target_id = conn.get('target_node_id')
+            if target_id not in node_types:
+                errors.append(f"{where} 连接到不存在的节点: {target_id}")
+                continue
+            source_output = conn.get('source_output', 'output')
+            if source_type is not None and source_output not in NODE_CONFIGS[source_type]['outputs']:
+                errors.append(f"{where} 没有输出端口 {source_output!r}，可用端口: "
+                              f"{', '.join(NODE_CONFIGS[source_type]['outputs']) or '无'}")
+            target_type = node_types[target_id]
+            target_input = conn.get('target_input')
+            if target_type is not None and target_input not in NODE_CONFIGS[target_type]['inputs']:
+                errors.append(f"{where} 连接的节点 '{target_id}' 没有输入端口 {target_input!r}，可用端口: "
+                              f"{', '.join(NODE_CONFIGS[target_type]['inputs']) or '无'}")
+
+    start_count = sum(1 for node_type in node_types.values() if node_type == NodeType.START)
+    if start_count != 1:
+        errors.append(f"{prefix}工作流必须有且只有一个开始节点，当前 {start_count} 个")
+    if not any(node_type == NodeType.END for node_type in node_types.values()):
+        errors.append(f"{prefix}工作流缺少结束节点")
+
+    normalized['nodes'] = normalized_nodes
+    return normalized
+
+def validate_workflow(workflow: Any) -> List[str]:
+    """返回工作流文档的全部结构问题，没有问题时返回空列表"""
+    errors: List[str] = []
+    _normalize_workflow(workflow, errors)
+    return errors
+
+# 已加载的工作流，按内容哈希缓存
+_loaded: "OrderedDict[str, LoadedWorkflow]" = OrderedDict()
+_loaded_lock = threading.Lock()
+
+def load_workflow(workflow: Any) -> LoadedWorkflow:
+    """校验、补全默认值并编译工作流，任何节点执行前暴露全部结构错误；相同内容只处理一次"""
+    key = make_cache_key(workflow)
+    with _loaded_lock:
+        loaded = _loaded.get(key)
+        if loaded is not None:
+            _loaded.move_to_end(key)
+            return loaded
+
+    errors: List[str] = []
+    normalized = _normalize_workflow(workflow, errors)
+    if errors:
+        raise WorkflowSchemaError(errors)
+    # 环路和条件表达式在执行计划编译时检查
+    loaded = LoadedWorkflow(key=key, workflow=normalized, plan=compile_workflow(normalized))
+
+    with _loaded_lock:
+        _loaded[key] = loaded
+        while len(_loaded) > DEFAULT_LOADED_CACHE_SIZE:
+            _loaded.popitem(last=False)
+    return loaded
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# 列表默认每页条数
+DEFAULT_PAGE_SIZE = 10
+
+class WorkflowStore:
+    """基于SQLite的工作流持久化存储，保存历史版本，按更新时间分页列出"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS workflows (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL DEFAULT '',
+                version INTEGER NOT NULL,
+                node_count INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_workflows_updated ON workflows (updated_at, id);
+            CREATE INDEX IF NOT EXISTS idx_workflows_created ON workflows (created_at);
+            CREATE TABLE IF NOT EXISTS workflow_versions (
+                workflow_id TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                saved_at TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (workflow_id, version)
+            );
+        """)
+        self._conn.commit()
+
+    def save(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        """保存工作流并返回带 id/version/时间戳的副本；已存在的工作流版本号加一"""
+        workflow = dict(workflow)
+        workflow_id = workflow.get('id') or uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, created_at FROM workflows WHERE id = ?", (workflow_id,)
+            ).fetchone()
+            version = row[0] + 1 if row else 1
+            workflow['id'] = workflow_id
+            workflow['version'] = version
+            workflow['created_at'] = row[1] if row else now
+            workflow['updated_at'] = now
+            data = json.dumps(workflow, ensure_ascii=False)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workflows (id, name, description, version, node_count, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (workflow_id, workflow.get('name', ''), workflow.get('description', ''), version,
+                 len(workflow.get('nodes', [])), workflow['created_at'], now, data)
+            )
+            self._conn.execute(
+                "INSERT INTO workflow_versions (workflow_id, version, saved_at, data) VALUES (?, ?, ?, ?)",
+                (workflow_id, version, now, data)
+            )
+            self._conn.commit()
+        return workflow
+
+    def get(self, workflow_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """按ID读取工作流，指定 version 时读取历史版本"""
+        with self._lock:
+            if version is None:
+                row = self._conn.execute("SELECT data FROM workflows WHERE id = ?", (workflow_id,)).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT data FROM workflow_versions WHERE workflow_id = ? AND version = ?",
+                    (workflow_id, version)
+                ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_page(self, limit: int = DEFAULT_PAGE_SIZE,
+                  cursor: Optional[Tuple[str, str]] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """按更新时间倒序分页列出工作流摘要（不含节点数据）
+
+        使用 (updated_at, id) 游标分页，翻页代价与页码无关。
+        返回 (摘要列表, 下一页游标)，没有更多数据时游标为None。
+        """
+        query = ("SELECT id, name, description, version, node_count, created_at, updated_at FROM workflows")
+        params: list = []
+        if cursor is not None:
+            query += " WHERE (updated_at, id) < (?, ?)"
+            params.extend(cursor)
+        query += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        items = [
+            {
+                'id': r[0], 'name': r[1], 'description': r[2], 'version': r[3],
+                'node_count': r[4], 'created_at': r[5], 'updated_at': r[6]
+            }
+            for r in rows[:limit]
+        ]
+        next_cursor = (items[-1]['updated_at'], items[-1]['id']) if len(rows) > limit else None
+        return items, next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM workflows").fetchone()[0]
+
+    def delete(self, workflow_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM workflows WHERE id = ?", (workflow_id,))
+            self._conn.execute("DELETE FROM workflow_versions WHERE workflow_id = ?", (workflow_id,))
+            self._conn.commit()